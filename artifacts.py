@@ -0,0 +1,156 @@
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# Artifacts passed from the statistics stage to the dataset stage
+MATCHES_PATH = "./statistics/wikigame_matches.parquet"
+STATISTICS_PATH = "./statistics/wikigame_statistics.parquet"
+
+# Schema of the human matches table (one row per played game)
+MATCHES_SCHEMA = pa.schema([
+    ("from_node", pa.string()),
+    ("to_node", pa.string()),
+    ("player_name", pa.string()),
+    ("path_length", pa.int64()),
+    ("path", pa.string()),
+    ("won", pa.bool_()),
+    ("time", pa.float64()),
+    ("points", pa.float64()),
+])
+
+# Schema of the per-pair statistics table (averages are null when nobody won)
+STATISTICS_SCHEMA = pa.schema([
+    ("from_node", pa.string()),
+    ("to_node", pa.string()),
+    ("total_games", pa.int64()),
+    ("won_games", pa.int64()),
+    ("win_percentage", pa.float64()),
+    ("avg_steps_to_win", pa.float64()),
+    ("avg_time_to_win", pa.float64()),
+])
+
+# Artifacts of the shortest-path oracle stage
+SHORTEST_PATHS_PATH = "./results/shortest_paths_wikigame.parquet"
+PATH_DISTANCES_PATH = "./results/path_distances_wikigame.parquet"
+
+# Schema of the per-pair oracle table (hops are null when the goal cannot be reached)
+SHORTEST_PATHS_SCHEMA = pa.schema([
+    ("from_node", pa.string()),
+    ("to_node", pa.string()),
+    ("shortest_hops", pa.int64()),
+    ("num_shortest_paths", pa.float64()),
+])
+
+# Schema of the per-record distances of the model paths (one entry per step, null when unknown)
+PATH_DISTANCES_SCHEMA = pa.schema([
+    ("game_mode", pa.string()),
+    ("game_num", pa.int64()),
+    ("model_name", pa.string()),
+    ("version_model", pa.string()),
+    ("type_context", pa.string()),
+    ("shortest_hops", pa.int64()),
+    ("distance_to_goal", pa.list_(pa.int64())),
+    ("optimality_gap", pa.int64()),
+])
+
+# Artifact of the human path validation stage
+HUMAN_VALIDATION_PATH = "./statistics/human_validation_wikigame.parquet"
+
+# Schema of the per-pair validation of the human paths (counts of edges by status)
+HUMAN_VALIDATION_SCHEMA = pa.schema([
+    ("from_node", pa.string()),
+    ("to_node", pa.string()),
+    ("human_num_paths", pa.int64()),
+    ("human_valid_paths", pa.int64()),
+    ("human_valid_path_percentage", pa.float64()),
+    ("human_num_no_link", pa.int64()),
+    ("human_num_no_page", pa.int64()),
+    ("human_num_redirect", pa.int64()),
+])
+
+
+class ParquetTableWriter:
+    """
+    Writes rows (dicts) to a Parquet file with a fixed schema, in row groups of
+    batch_size rows, so that large tables never have to be kept in memory.
+    """
+
+    def __init__(self, path, schema, batch_size=100000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.schema = schema
+        self.batch_size = batch_size
+        self.rows = []
+        self.writer = pq.ParquetWriter(path, schema)
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_table(pa.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_table(path, schema):
+    """
+    Reads a Parquet artifact into a DataFrame, checking it against the expected schema.
+    """
+    table = pq.read_table(path)
+    if not table.schema.equals(schema):
+        raise ValueError(f"'{path}' does not match the expected schema:\n{table.schema}")
+    return table.to_pandas()
+
+
+def read_matches(path=MATCHES_PATH):
+    """
+    Returns the human matches table.
+    """
+    return read_table(path, MATCHES_SCHEMA)
+
+
+def read_statistics(path=STATISTICS_PATH):
+    """
+    Returns the per-pair statistics table, with "N/A" for the averages of pairs nobody won
+    (as in the Excel sheet).
+    """
+    df_stats = read_table(path, STATISTICS_SCHEMA)
+    for column in ["avg_steps_to_win", "avg_time_to_win"]:
+        df_stats[column] = df_stats[column].astype(object).where(df_stats[column].notna(), "N/A")
+    return df_stats
+
+
+def read_shortest_paths(path=SHORTEST_PATHS_PATH):
+    """
+    Returns the per-pair shortest-path table of the oracle stage.
+    """
+    return read_table(path, SHORTEST_PATHS_SCHEMA)
+
+
+def read_path_distances(path=PATH_DISTANCES_PATH):
+    """
+    Returns the per-record distances to the goal of the model paths.
+    """
+    return read_table(path, PATH_DISTANCES_SCHEMA)
+
+
+def read_human_validation(path=HUMAN_VALIDATION_PATH):
+    """
+    Returns the per-pair validation of the human paths.
+    """
+    return read_table(path, HUMAN_VALIDATION_SCHEMA)
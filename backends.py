@@ -0,0 +1,252 @@
+import difflib
+import json
+import re
+import time
+
+from api_key import GPT_API_KEY, LLAMA_ENDPOINT_URL
+from distancetracking import distance_graph, get_distance_map, distance_to_goal
+from httpclient import http_client, HttpError
+from llamabatch import MicroBatcher, BatchNotSupported
+from prompts import link_list_format, parse_link_list
+from settings import openai_api_base, model_backend_override, model_timeout, model_stream
+from settings import llama_batch_size, llama_batch_window, llama_batch_timeout, llama_batch_retries, llama_max_requests_in_flight
+
+
+def record_usage(usage, reported):
+    """
+    Appends the prompt, cached prompt and completion tokens of a model call to the usage list.
+    Values the provider does not report are None.
+    """
+    if usage is None:
+        return
+    reported = reported or {}
+    usage.append({
+        "prompt_tokens": reported.get("prompt_tokens"),
+        "cached_tokens": (reported.get("prompt_tokens_details") or {}).get("cached_tokens"),
+        "completion_tokens": reported.get("completion_tokens")
+    })
+
+
+class ModelBackend:
+    """
+    Interface of a model provider. A backend answers a (system context, user request)
+    prompt with the raw text of the model, which the runner parses.
+    - generate: the whole answer, streamed and collected when model_stream is set
+    - stream: the answer in chunks, as the model produces them
+    timeout is the time allowed for the whole answer, in seconds.
+    """
+
+    # Name of the provider, used for its concurrency and rate limits in settings.py
+    provider = None
+    # Seed sent with every request, if the provider supports one
+    seed = None
+
+    def __init__(self, version):
+        self.version = version
+
+    def generate(self, context, request, usage=None, timeout=model_timeout):
+        if model_stream:
+            return "".join(self.stream(context, request, usage, timeout))
+        return self.complete(context, request, usage, timeout)
+
+    def complete(self, context, request, usage=None, timeout=model_timeout):
+        raise NotImplementedError
+
+    def stream(self, context, request, usage=None, timeout=model_timeout):
+        # Providers without streaming return the whole answer as a single chunk
+        yield self.complete(context, request, usage, timeout)
+
+
+class OpenAIBackend(ModelBackend):
+    """
+    OpenAI chat completions (GPT models), with server-sent events for streaming.
+    """
+
+    provider = "GPT"
+    seed = 42
+
+    def request_body(self, context, request):
+        return {
+            "model": self.version,
+            "seed": self.seed,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": context
+                },
+                {
+                    "role": "user",
+                    "content": request
+                }
+            ]
+        }
+
+    def complete(self, context, request, usage=None, timeout=model_timeout):
+        response = http_client.post(
+            f"{openai_api_base}/chat/completions",
+            headers={"Content-Type": "application/json", "Authorization": GPT_API_KEY},
+            json=self.request_body(context, request),
+            timeout=timeout
+        )
+        response_json = response.json()
+        if 'choices' not in response_json:
+            raise HttpError(f"OpenAI request failed: {response_json.get('error')}")
+        record_usage(usage, response_json.get("usage"))
+        return response_json['choices'][0]['message']['content']
+
+    def stream(self, context, request, usage=None, timeout=model_timeout):
+        deadline = time.monotonic() + timeout
+        body = dict(self.request_body(context, request), stream=True, stream_options={"include_usage": True})
+        response = http_client.post(
+            f"{openai_api_base}/chat/completions",
+            headers={"Content-Type": "application/json", "Authorization": GPT_API_KEY},
+            json=body,
+            timeout=timeout,
+            stream=True
+        )
+        if not response.ok:
+            raise HttpError(f"OpenAI request failed: HTTP {response.status_code}")
+        reported = None
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if time.monotonic() > deadline:
+                    raise HttpError(f"OpenAI answer not completed in {timeout} seconds")
+                if not line or not line.startswith("data: "):
+                    continue
+                payload = line[len("data: "):]
+                if payload == "[DONE]":
+                    break
+                chunk = json.loads(payload)
+                # The last chunk carries the usage of the whole answer
+                if chunk.get("usage"):
+                    reported = chunk["usage"]
+                for choice in chunk.get("choices", []):
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        yield text
+        record_usage(usage, reported)
+
+
+class LlamaBackend(ModelBackend):
+    """
+    Self-hosted LLAMA endpoint, which answers a {"richiesta", "contesto"} request with plain text.
+    The prompts of concurrent jobs are micro-batched (see llamabatch.MicroBatcher) into
+    {"batch": [...]} requests, answered with {"risposte": [...]}, when the endpoint supports them.
+    The prompts are (context, request, timeout): a prompt sent on its own gets the timeout of its
+    call, a batch gets llama_batch_timeout.
+    """
+
+    provider = "LLAMA"
+
+    def __init__(self, version, endpoint_url=None):
+        super().__init__(version)
+        self.endpoint_url = endpoint_url or LLAMA_ENDPOINT_URL
+        self.batcher = MicroBatcher(
+            lambda prompts: self.send_batch(prompts),
+            lambda prompt: self.send_single(prompt),
+            max_size=llama_batch_size,
+            window=llama_batch_window,
+            max_in_flight=llama_max_requests_in_flight
+        )
+
+    def send_single(self, prompt):
+        context, request, timeout = prompt
+        data = {
+            "richiesta": request,
+            "contesto": context
+        }
+        response = http_client.post(self.endpoint_url, headers={"Content-Type": "application/json"}, data=json.dumps(data), timeout=timeout)
+        if not response.ok:
+            raise HttpError(f"LLAMA request failed: HTTP {response.status_code}")
+        return response.text
+
+    def send_batch(self, prompts, timeout=llama_batch_timeout):
+        """
+        Sends the prompts as one batched request. Returns the answers in order, with an HttpError
+        in place of the answer of a failed prompt. A failed batch is retried only llama_batch_retries
+        times, as its prompts are then sent one by one with their own retries.
+        """
+        data = {"batch": [{"richiesta": request, "contesto": context} for context, request, _ in prompts]}
+        response = http_client.post(
+            self.endpoint_url,
+            max_retries=llama_batch_retries,
+            headers={"Content-Type": "application/json"},
+            data=json.dumps(data),
+            timeout=timeout
+        )
+        if response.status_code in (400, 404, 405, 415, 422, 501):
+            raise BatchNotSupported(f"HTTP {response.status_code}")
+        if not response.ok:
+            raise HttpError(f"LLAMA batch failed: HTTP {response.status_code}")
+        try:
+            answers = response.json()["risposte"]
+        except (ValueError, KeyError, TypeError):
+            raise BatchNotSupported("no 'risposte' list in the answer")
+        if not isinstance(answers, list) or len(answers) != len(prompts):
+            raise HttpError(f"LLAMA batch returned {len(answers)} answers for {len(prompts)} prompts")
+        return [answer if isinstance(answer, str) else HttpError(f"LLAMA prompt failed: {answer}") for answer in answers]
+
+    def complete(self, context, request, usage=None, timeout=model_timeout):
+        text = self.batcher.call((context, request, timeout))
+        # The endpoint does not report token usage
+        record_usage(usage, None)
+        return text
+
+
+class StubBackend(ModelBackend):
+    """
+    Offline, deterministic agent for load tests and benchmarks without network or GPU.
+    With a distance graph (see distancetracking) it answers the Blind contexts with a
+    shortest path and picks the offered link closest to the goal; without one it
+    answers "Start -> End" and picks the offered link most similar to the goal title.
+    Token usage is estimated at about 4 characters per token.
+    """
+
+    provider = "STUB"
+
+    def complete(self, context, request, usage=None, timeout=model_timeout):
+        start, end = re.match(r"Start_Node: (.*) - End_Node: (.*)", request.split("\n")[0]).groups()
+        distances = get_distance_map(end)
+        if "List_Link_From_Start_Node:" not in request:
+            path = distance_graph.shortest_path(distances, start) if distances is not None else None
+            text = "###\n" + " -> ".join(path or [start, end])
+        else:
+            links = parse_link_list(request.split("List_Link_From_Start_Node:\n", 1)[1])
+            if not links:
+                choice = end
+            else:
+                def closeness(link):
+                    distance = distance_to_goal(distances, link)
+                    similarity = difflib.SequenceMatcher(None, link.lower(), end.lower()).ratio()
+                    return (distance is None, distance or 0, -similarity)
+                choice = min(links, key=closeness)
+            if link_list_format == "numbered" and links:
+                choice = str(links.index(choice) + 1)
+            text = f"###\n{choice}\n@@@"
+        record_usage(usage, {"prompt_tokens": (len(context) + len(request)) // 4, "completion_tokens": len(text) // 4})
+        return text
+
+
+# Backend of each provider name used in models.py
+BACKENDS = {
+    "GPT": OpenAIBackend,
+    "LLAMA": LlamaBackend,
+    "STUB": StubBackend,
+}
+
+# One backend instance per (provider, version)
+backend_instances = {}
+
+
+def get_backend(model):
+    """
+    Returns the backend of a [provider, version] model of models.py, or the
+    model_backend_override backend when one is set.
+    """
+    name = model_backend_override or model[0]
+    key = (name, model[1])
+    if key not in backend_instances:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown model backend '{name}', expected one of {sorted(BACKENDS)}")
+        backend_instances.setdefault(key, BACKENDS[name](model[1]))
+    return backend_instances[key]
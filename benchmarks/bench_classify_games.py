@@ -0,0 +1,105 @@
+"""
+Benchmark of classify_pairs (create_dataset_paper_wikigame.py) on a synthetic human log,
+against the previous row-by-row implementation.
+
+Usage: python benchmarks/bench_classify_games.py [num_sessions] [num_pairs] [legacy_pairs]
+
+The previous implementation scans every game for every pair, so it is timed on the first
+legacy_pairs pairs only and its time is extrapolated to all the pairs. Its output on those
+pairs is also compared with the new one.
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from create_dataset_paper_wikigame import classify_pairs
+
+
+def make_synthetic_log(num_sessions, num_pairs, seed=42):
+    """
+    Returns (df_games, df_stats) shaped like the sheets of wikigame_statistics.xlsx.
+    """
+    rng = np.random.default_rng(seed)
+    pair_ids = rng.integers(0, num_pairs, num_sessions)
+    # Each pair gets its own win rate, so that all the difficulty bins are populated
+    win_rates = rng.uniform(0, 0.9, num_pairs)
+    won = rng.random(num_sessions) < win_rates[pair_ids]
+    path_length = rng.integers(2, 12, num_sessions)
+    df_games = pd.DataFrame({
+        "from_node": [f"Start_{i}" for i in pair_ids],
+        "to_node": [f"End_{i}" for i in pair_ids],
+        "player_name": [f"player_{i}" for i in rng.integers(0, 5000, num_sessions)],
+        "path_length": path_length,
+        "path": [f"Start_{p} -> Page_{n} -> End_{p}" for p, n in zip(pair_ids, path_length)],
+        "won": won,
+    })
+
+    grouped = df_games.groupby(["from_node", "to_node"], sort=False)
+    df_stats = grouped.agg(total_games=("won", "size"), won_games=("won", "sum")).reset_index()
+    df_stats["win_percentage"] = (df_stats["won_games"] / df_stats["total_games"] * 100).round(2)
+    avg_steps = df_games[df_games["won"]].groupby(["from_node", "to_node"])["path_length"].mean().round(2)
+    df_stats["avg_steps_to_win"] = [
+        avg_steps.get((f, t), "N/A") for f, t in zip(df_stats["from_node"], df_stats["to_node"])
+    ]
+    return df_games, df_stats
+
+
+def classify_pairs_legacy(df_games, df_stats):
+    """
+    Previous implementation: one boolean mask over all the games and one iterrows per pair.
+    """
+    result = {"MEDIUM": [], "HARD": [], "VERY_HARD": [], "IMPOSSIBLE": []}
+    for _, row in df_stats.iterrows():
+        from_node = row["from_node"]
+        to_node = row["to_node"]
+        win_percentage = row["win_percentage"]
+        if 50 <= win_percentage <= 75:
+            difficulty = "MEDIUM"
+        elif 25 <= win_percentage <= 49:
+            difficulty = "HARD"
+        elif 1 <= win_percentage <= 24:
+            difficulty = "VERY_HARD"
+        elif win_percentage < 1:
+            difficulty = "IMPOSSIBLE"
+        else:
+            difficulty = "SKIP"
+        if difficulty != "SKIP":
+            filtered_games = df_games[(df_games["from_node"] == from_node) & (df_games["to_node"] == to_node)]
+            result[difficulty].append({
+                "start_node": from_node,
+                "end_node": to_node,
+                "avg_human_step_to_win": row["avg_steps_to_win"],
+                "list_path_user_with_result": [
+                    (row_game["path"], bool(row_game["won"])) for _, row_game in filtered_games.iterrows()
+                ],
+            })
+    return result
+
+
+if __name__ == "__main__":
+    num_sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    num_pairs = int(sys.argv[2]) if len(sys.argv) > 2 else 4000
+    legacy_pairs = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    df_games, df_stats = make_synthetic_log(num_sessions, num_pairs)
+    print(f"Synthetic log: {len(df_games)} sessions, {len(df_stats)} pairs")
+
+    start = time.perf_counter()
+    result = classify_pairs(df_games, df_stats)
+    new_time = time.perf_counter() - start
+    print(f"classify_pairs: {new_time:.2f} s")
+
+    subset = df_stats.head(legacy_pairs)
+    start = time.perf_counter()
+    legacy_result = classify_pairs_legacy(df_games, subset)
+    legacy_time = (time.perf_counter() - start) * len(df_stats) / len(subset)
+    print(f"previous implementation: {legacy_time:.2f} s (extrapolated from {len(subset)} pairs)")
+    print(f"speedup: {legacy_time / new_time:.1f}x")
+
+    same = json.dumps(classify_pairs(df_games, subset), indent=2) == json.dumps(legacy_result, indent=2)
+    print(f"identical output on the timed pairs: {same}")
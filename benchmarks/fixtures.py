@@ -0,0 +1,198 @@
+"""
+Deterministic fixtures of the offline benchmarks, written to a directory:
+- api/pages.json: the pages of a synthetic wiki as returned by the Wikipedia API (title,
+  pageid, links, categories, redirects), with disambiguation pages and redirects
+- html/<pageid>.html: the rendered article of every page, with the elements the visible
+  link extractors must skip (navboxes, red links, namespaced and external links, comments)
+- dataset/dataset_wiki_game_complete.json: a synthetic human gameplay log
+- llm/responses.json: canned answers of the Blind contexts for every start--goal pair
+
+Usage: python benchmarks/fixtures.py <directory> [num_pages] [num_pairs] [num_sessions]
+"""
+import json
+import os
+import random
+import sys
+from urllib.parse import quote
+
+
+WORDS = [
+    "river", "castle", "theory", "music", "island", "empire", "language", "battle", "engine", "forest",
+    "planet", "poetry", "bridge", "church", "desert", "festival", "harbor", "kingdom", "library", "market",
+    "mountain", "museum", "novel", "ocean", "painting", "railway", "republic", "science", "temple", "valley",
+]
+ADJECTIVES = [
+    "ancient", "northern", "royal", "modern", "eastern", "classical", "great", "western", "southern", "lost",
+    "imperial", "early", "upper", "lower", "central", "new", "old", "holy", "little", "grand",
+]
+
+# Links per page: most pages are ordinary articles, a few hubs need continued API queries
+MIN_LINKS, MAX_LINKS, HUB_LINKS = 40, 250, 700
+
+
+def make_titles(rng, num_pages):
+    titles = set()
+    while len(titles) < num_pages:
+        title = f"{rng.choice(ADJECTIVES).capitalize()} {rng.choice(WORDS)} of {rng.choice(WORDS)}"
+        if rng.random() < 0.3:
+            title += f" ({rng.randint(1000, 2020)})"
+        titles.add(title)
+    return sorted(titles)
+
+
+def make_pages(rng, num_pages):
+    """
+    Returns the API records of the articles, disambiguation pages and redirects of the wiki.
+    """
+    titles = make_titles(rng, num_pages)
+    pages = []
+    for i, title in enumerate(titles):
+        num_links = HUB_LINKS if i % 97 == 0 else rng.randint(MIN_LINKS, MAX_LINKS)
+        links = rng.sample(titles, min(num_links, len(titles) - 1))
+        pages.append({"pageid": i + 1, "ns": 0, "title": title, "links": sorted(set(links) - {title}), "categories": []})
+
+    # Disambiguation pages, whose first link is the page they stand for
+    for i in range(max(1, num_pages // 40)):
+        targets = rng.sample(titles, 3)
+        pages.append({
+            "pageid": len(pages) + 1, "ns": 0, "title": f"{targets[0].split(' of ')[0]} (disambiguation {i})",
+            "links": targets, "categories": ["Category:Disambiguation pages"]
+        })
+
+    # Redirects: alternative titles of some articles, also used as link targets
+    articles = pages[:num_pages]
+    for page in rng.sample(articles, num_pages // 10):
+        alias = page["title"].replace(" of ", " of the ")
+        pages.append({"pageid": len(pages) + 1, "ns": 0, "title": alias, "redirect": page["title"], "links": [page["title"]], "categories": []})
+        for linking in rng.sample(articles, 3):
+            if page["title"] in linking["links"]:
+                linking["links"][linking["links"].index(page["title"])] = alias
+
+    for page in pages:
+        page["redirects"] = sorted(other["title"] for other in pages if other.get("redirect") == page["title"])
+    return pages
+
+
+def href(title):
+    return "/wiki/" + quote(title.replace(" ", "_"), safe="()_,'")
+
+
+def make_html(rng, page):
+    """
+    Returns the rendered article of a page: most links in paragraphs and an infobox, the
+    rest in a navbox, plus links the extractors must skip and some filler text.
+    """
+    links = list(page["links"])
+    rng.shuffle(links)
+    navbox_links = links[:len(links) // 5]
+    body_links = links[len(links) // 5:]
+    filler = " ".join(rng.choice(WORDS) for _ in range(60))
+
+    paragraphs = []
+    for i in range(0, len(body_links), 8):
+        anchors = ", ".join(f'<a href="{href(title)}" title="{title}">{title.lower()}</a>' for title in body_links[i:i + 8])
+        paragraphs.append(
+            f"<p>{filler[:200]} {anchors}.<sup class=\"reference\"><a href=\"#cite_note-{i}\">[{i}]</a></sup><br>"
+            f"<a href=\"/wiki/Red_link_{i}\" class=\"new\" title=\"Red link (page does not exist)\">red</a> "
+            f"<a href=\"/wiki/File:Image_{i}.jpg\" class=\"mw-file-description\"><img src=\"x.jpg\" alt=\"\"></a> "
+            f"<a href=\"https://example.org/{i}\" class=\"external text\">source</a></p>"
+            f"<!-- <a href=\"/wiki/Commented_{i}\">hidden</a> -->"
+        )
+    infobox = "".join(f'<tr><th>Related</th><td><a href="{href(title)}">{title}</a></td></tr>' for title in body_links[:5])
+    navbox = "".join(f'<li><a href="{href(title)}" title="{title}">{title}</a></li>' for title in navbox_links)
+
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"UTF-8\"><title>" + page["title"] + "</title>"
+        "<link rel=\"stylesheet\" href=\"/w/load.php\"></head><body>"
+        "<div id=\"mw-navigation\"><a href=\"/wiki/Main_Page\">Main page</a><a href=\"/wiki/Special:Random\">Random</a></div>"
+        "<div id=\"content\"><h1 id=\"firstHeading\">" + page["title"] + "</h1>"
+        "<div id=\"bodyContent\"><div id=\"siteSub\">From Wikipedia, the free encyclopedia</div>"
+        "<div id=\"mw-content-text\" class=\"mw-body-content\"><div class=\"mw-content-ltr mw-parser-output\" lang=\"en\">"
+        "<table class=\"infobox\"><tbody>" + infobox + "</tbody></table>"
+        + "".join(paragraphs) +
+        "<div role=\"navigation\" class=\"navbox\"><table><tr><td><ul>" + navbox + "</ul></td></tr></table></div>"
+        "</div></div>"
+        "<div id=\"catlinks\"><a href=\"/wiki/Help:Category\">Categories</a></div>"
+        "</div></div>"
+        "<div id=\"footer\"><a href=\"/wiki/Wikipedia:About\">About</a><a href=\"" + href(page["title"]) + "\">Permanent link</a></div>"
+        "</body></html>"
+    )
+
+
+def random_walk(rng, links_of, start, end, max_length):
+    path = [start]
+    while len(path) < max_length and path[-1] != end:
+        links = links_of.get(path[-1])
+        if not links:
+            break
+        path.append(end if end in links else rng.choice(links))
+    return path
+
+
+def make_log(rng, pages, num_pairs, num_sessions):
+    """
+    Returns the human gameplay log: sessions of random start--goal pairs, each with its own
+    win rate. Won sessions end on the goal, the last hop is not always a real link.
+    """
+    articles = [page for page in pages if "redirect" not in page and not page["categories"]]
+    links_of = {page["title"].replace(" ", "_"): [link.replace(" ", "_") for link in page["links"]] for page in pages}
+    pairs = [tuple(page["title"].replace(" ", "_") for page in rng.sample(articles, 2)) for _ in range(num_pairs)]
+    win_rates = [rng.uniform(0, 0.9) for _ in pairs]
+
+    log = {}
+    for session in range(num_sessions):
+        pair = rng.randrange(len(pairs))
+        start, end = pairs[pair]
+        won = rng.random() < win_rates[pair]
+        path = random_walk(rng, links_of, start, end, rng.randint(3, 10))
+        if won and path[-1] != end:
+            path.append(end)
+        log.setdefault(f"FROM_{start}_TO_{end}", []).append({
+            "player_name": f"player_{rng.randrange(500)}",
+            "path_concept": path,
+            "won": won,
+            "time": round(rng.uniform(20, 400), 1) if rng.random() < 0.9 else None,
+            "points": float(rng.randint(0, 1000)),
+        })
+    return log, pairs, links_of
+
+
+def make_fixtures(directory, num_pages=400, num_pairs=60, num_sessions=3000, seed=42):
+    """
+    Writes the fixtures to directory and returns a summary of their size.
+    """
+    rng = random.Random(seed)
+    pages = make_pages(rng, num_pages)
+    log, pairs, links_of = make_log(rng, pages, num_pairs, num_sessions)
+    # Canned Blind answers: a walk that ends on the goal, as a model would guess it, some with
+    # a hop that is not a link or a page that does not exist
+    titles = sorted(links_of)
+    responses = {}
+    for start, end in pairs:
+        path = random_walk(rng, links_of, start, end, 6)[:-1] + [end]
+        if rng.random() < 0.4:
+            path.insert(rng.randint(1, len(path) - 1), rng.choice(titles))
+        if rng.random() < 0.2:
+            path.insert(rng.randint(1, len(path) - 1), f"Imaginary_{rng.choice(WORDS)}")
+        responses[f"{start}|{end}"] = path
+
+    for name in ["api", "html", "dataset", "llm"]:
+        os.makedirs(os.path.join(directory, name), exist_ok=True)
+    with open(os.path.join(directory, "api", "pages.json"), "w", encoding="utf-8") as f:
+        json.dump(pages, f)
+    for page in pages:
+        if "redirect" not in page:
+            with open(os.path.join(directory, "html", f"{page['pageid']}.html"), "w", encoding="utf-8") as f:
+                f.write(make_html(rng, page))
+    with open(os.path.join(directory, "dataset", "dataset_wiki_game_complete.json"), "w", encoding="utf-8") as f:
+        json.dump(log, f)
+    with open(os.path.join(directory, "llm", "responses.json"), "w", encoding="utf-8") as f:
+        json.dump(responses, f)
+
+    return {"pages": len(pages), "pairs": len(pairs), "sessions": num_sessions, "seed": seed}
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1]
+    sizes = [int(value) for value in sys.argv[2:5]]
+    print(make_fixtures(directory, *sizes))
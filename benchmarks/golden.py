@@ -0,0 +1,87 @@
+"""
+Golden files of the visible link extractors: Wikipedia articles saved in golden/<title>.html,
+each with the links a player can follow in it in golden/<title>.json. Both extract_visible_links
+and extract_visible_links_bs4 must return exactly these links.
+
+Usage: python benchmarks/golden.py                    checks every golden file
+       python benchmarks/golden.py --update TITLE...  downloads the articles and writes their
+                                                      links with the reference extractor
+The links written by --update must be reviewed by hand before they are committed.
+"""
+import argparse
+import json
+import os
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_DIR = os.path.join(BENCHMARKS_DIR, "golden")
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+
+def disable_metrics():
+    """
+    Turns off the metrics file of the pipeline, which the checks must not write to.
+    Must run before the pipeline modules are imported, as they read the settings on import.
+    """
+    import settings
+    settings.metrics_enabled = False
+
+
+def golden_titles(directory=GOLDEN_DIR):
+    return sorted(name[:-len(".html")] for name in os.listdir(directory) if name.endswith(".html"))
+
+
+def check_golden(directory=GOLDEN_DIR):
+    """
+    Runs both extractors on every golden article. Returns the list of differences
+    from the expected links (empty when both extractors match every file).
+    """
+    disable_metrics()
+    from wikigametools import extract_visible_links, extract_visible_links_bs4
+
+    problems = []
+    for title in golden_titles(directory):
+        with open(os.path.join(directory, f"{title}.html"), encoding="utf-8") as f:
+            html = f.read()
+        with open(os.path.join(directory, f"{title}.json"), encoding="utf-8") as f:
+            expected = set(json.load(f))
+        for extractor in [extract_visible_links, extract_visible_links_bs4]:
+            links = set(extractor(html))
+            if links != expected:
+                problems.append(
+                    f"{title}: {extractor.__name__} misses {sorted(expected - links)} and adds {sorted(links - expected)}"
+                )
+    return problems
+
+
+def update_golden(titles, directory=GOLDEN_DIR):
+    """
+    Saves the current version of the articles and their links found by the reference extractor.
+    """
+    disable_metrics()
+    from httpclient import http_client
+    from settings import wikipedia_base_url
+    from wikigametools import extract_visible_links_bs4
+
+    for title in titles:
+        html = http_client.get(f"{wikipedia_base_url}{title}").text
+        with open(os.path.join(directory, f"{title}.html"), "w", encoding="utf-8") as f:
+            f.write(html)
+        with open(os.path.join(directory, f"{title}.json"), "w", encoding="utf-8") as f:
+            json.dump(extract_visible_links_bs4(html), f, ensure_ascii=False, indent=1)
+        print(f"Saved '{title}': review golden/{title}.json before committing it")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Golden-file check of the visible link extractors.")
+    parser.add_argument("--update", nargs="+", metavar="TITLE", help="download these articles and write their links")
+    args = parser.parse_args()
+
+    if args.update:
+        update_golden(args.update)
+        sys.exit(0)
+    problems = check_golden()
+    for problem in problems:
+        print(problem)
+    print(f"{len(golden_titles())} golden articles, {'FAILED' if problems else 'ok'}")
+    sys.exit(1 if problems else 0)
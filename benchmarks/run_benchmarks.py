@@ -0,0 +1,449 @@
+"""
+Offline benchmarks of the hot paths of the pipeline, on the fixtures of fixtures.py served by
+stubserver.py: the Wikipedia API, the articles and the models are all local, so the numbers
+only depend on the code and the machine.
+
+Usage: python benchmarks/run_benchmarks.py [--repeat 3] [--pages 200] [--games 3] [--latency-ms 0]
+                                          [--output FILE] [--compare BASELINE] [--threshold 0.2]
+
+Every benchmark runs repeat times after an untimed setup (the caches it needs emptied or
+filled) and its median, min and max times are saved in a JSON file together with the number
+of requests served by the stand-in. With --compare, a benchmark whose best time is more than
+threshold slower than in the baseline file, one sending more requests, or a failed check (the
+two link extractors on the fixtures and on the golden articles, validate_paths against
+check_error_steps, the ranking of the prefetch candidates against a full sort, batch mode
+against the synchronous run) is reported as a regression and the exit status is 1.
+"""
+import argparse
+import difflib
+import json
+import os
+import platform
+import runpy
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from fixtures import make_fixtures
+from golden import check_golden
+from stubserver import StubServer
+
+
+def configure(server, games):
+    """
+    Points the pipeline to the stand-in and turns off everything that would make the runs
+    depend on each other or on the machine (response cache, rate limits, metrics file).
+    Must run before the pipeline modules are imported, as they read the settings on import.
+    """
+    import api_key
+    import settings
+    settings.wikipedia_api_url = f"{server.url}/w/api.php"
+    settings.wikipedia_base_url = f"{server.url}/wiki/"
+    settings.openai_api_base = f"{server.url}/v1"
+    api_key.LLAMA_ENDPOINT_URL = f"{server.url}/llama"
+    settings.link_graph_path = None
+    settings.distance_graph_path = None
+    settings.cache_offline = False
+    settings.host_requests_per_minute = {}
+    settings.provider_requests_per_minute = dict.fromkeys(settings.provider_requests_per_minute)
+    settings.provider_tokens_per_minute = dict.fromkeys(settings.provider_tokens_per_minute)
+    settings.response_cache_mode = "off"
+    settings.batch_mode = False
+    settings.batch_poll_interval = 0
+    settings.model_backend_override = None
+    settings.model_stream = False
+    settings.metrics_enabled = False
+    settings.statistics_excel = False
+    settings.num_game_test = games
+
+
+def run_script(name, *args):
+    """
+    Runs a pipeline script of the repository as __main__ in this process.
+    """
+    argv = sys.argv
+    sys.argv = [name, *args]
+    try:
+        runpy.run_path(os.path.join(REPO_DIR, name), run_name="__main__")
+    finally:
+        sys.argv = argv
+
+
+def measure(server, setup, run, repeat, exact_requests=True):
+    """
+    Returns the timings of run over repeat repetitions, each after setup, and the number of
+    requests the stand-in served in each repetition. exact_requests is False when the
+    requests depend on timing (concurrent jobs and prefetching), so they are not compared.
+    """
+    times = []
+    requests = []
+    for _ in range(repeat):
+        setup()
+        before = sum(server.counts.values())
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+        requests.append(sum(server.counts.values()) - before)
+    return {
+        "median_s": statistics.median(times),
+        "min_s": min(times),
+        "max_s": max(times),
+        "repeat": repeat,
+        "requests": requests,
+        "exact_requests": exact_requests,
+    }
+
+
+def run_benchmarks(server, fixtures_dir, num_pages, repeat, llama_latency):
+    """
+    Runs every benchmark and returns (benchmarks, checks).
+    """
+    import pandas as pd
+    from contextlib import redirect_stdout
+    from create_dataset_paper_wikigame import classify_games_by_difficulty, classify_games_by_difficulty_parquet
+    from pathvalidation import check_error_steps, validate_paths
+    from wikicache import link_cache
+    from wikigametools import get_internal_links_from_article, get_all_visible_existing_internal_links, get_visible_link_set
+    from wikigametools import extract_visible_links, extract_visible_links_bs4
+    from artifacts import read_matches, read_statistics
+    from linkprefetch import rank_candidates
+
+    with open(os.path.join(fixtures_dir, "api", "pages.json"), encoding="utf-8") as f:
+        pages = json.load(f)
+    articles = [page for page in pages if "redirect" not in page][:num_pages]
+    titles = [page["title"].replace(" ", "_") for page in articles]
+    html = []
+    for page in articles:
+        with open(os.path.join(fixtures_dir, "html", f"{page['pageid']}.html"), encoding="utf-8") as f:
+            html.append(f.read())
+
+    def cold():
+        link_cache.clear()
+        get_visible_link_set.cache_clear()
+
+    def cached():
+        link_cache.clear_memory()
+        get_visible_link_set.cache_clear()
+
+    def nothing():
+        pass
+
+    # Scripts print their progress, which is not part of the report
+    def stage(name, *args):
+        def run():
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                run_script(name, *args)
+        return run
+
+    results = {}
+    # The statistics stage first: its Parquet files are the input of the dataset benchmarks
+    results["statistics_stage"] = measure(server, nothing, stage("get_statistics_dataset_complete_wikigame.py"), repeat)
+    df_matches, df_stats = read_matches(), read_statistics()
+    with pd.ExcelWriter("./statistics/wikigame_statistics.xlsx", engine="openpyxl") as writer:
+        df_matches.to_excel(writer, sheet_name="All Matches", index=False)
+        df_stats.to_excel(writer, sheet_name="Statistics", index=False)
+    results["classify_games_by_difficulty_excel"] = measure(server, nothing, lambda: classify_games_by_difficulty("./statistics/wikigame_statistics.xlsx"), repeat)
+    results["classify_games_by_difficulty_parquet"] = measure(server, nothing, classify_games_by_difficulty_parquet, repeat)
+
+    def all_links():
+        for title in titles:
+            get_internal_links_from_article(title)
+    results["get_internal_links_from_article_cold"] = measure(server, cold, all_links, repeat)
+    results["get_internal_links_from_article_cached"] = measure(server, cached, all_links, repeat)
+
+    def all_visible_links():
+        for title in titles:
+            get_all_visible_existing_internal_links(title, [title])
+    results["get_all_visible_existing_internal_links_cold"] = measure(server, cold, all_visible_links, repeat)
+    results["get_all_visible_existing_internal_links_cached"] = measure(server, cached, all_visible_links, repeat)
+    results["extract_visible_links"] = measure(server, nothing, lambda: [extract_visible_links(text) for text in html], repeat)
+    results["extract_visible_links_bs4"] = measure(server, nothing, lambda: [extract_visible_links_bs4(text) for text in html], repeat)
+
+    # Every title of the fixtures offered at once, ranked towards a few end nodes as a prefetch step does
+    all_titles = [page["title"].replace(" ", "_") for page in pages]
+    ends = titles[:20]
+    results["rank_candidates"] = measure(server, nothing, lambda: [rank_candidates(all_titles, end, 3) for end in ends], repeat)
+
+    def full_ranking(end, budget):
+        return sorted(all_titles, key=lambda link: -difflib.SequenceMatcher(None, link.lower(), end.lower()).ratio())[:budget]
+
+    # Human paths of the log, as the model paths they are checked like
+    paths = [path.split(" -> ") for path in df_matches["path"].tolist()[:num_pages]]
+
+    def check_all_paths():
+        for path in paths:
+            check_error_steps(path)
+    results["check_error_steps_cold"] = measure(server, cold, check_all_paths, repeat)
+    results["check_error_steps_cached"] = measure(server, cached, check_all_paths, repeat)
+    results["validate_paths_cold"] = measure(server, cold, lambda: validate_paths(paths), repeat)
+
+    def clean_run():
+        cold()
+        shutil.rmtree("./results", ignore_errors=True)
+    results["end_to_end"] = measure(server, clean_run, lambda: [
+        stage(name)() for name in [
+            "get_statistics_dataset_complete_wikigame.py",
+            "create_dataset_paper_wikigame.py",
+            "get_result_paper_wikigame.py",
+            "export_results_wikigame.py",
+        ]
+    ], repeat, exact_requests=False)
+    with open("./dataset/dataset_paper.json", encoding="utf-8") as f:
+        results["end_to_end"]["games"] = sum(len(games) for games in json.load(f).values())
+
+    def batch_mode_parity():
+        """
+        Runs the experiments stage again with batch_mode, stopped while the batch is polled and
+        run again, as an interrupted run is. The second run must resume the batch of the first
+        one instead of submitting another, and store the same records as the synchronous run.
+        """
+        import openaibatch
+        import settings
+        from resultstore import merged_records, record_key
+
+        def outcomes():
+            return {record_key(record): (record["steps"], record["errors"]) for record in merged_records(settings.results_store_path)}
+
+        class Interrupted(Exception):
+            pass
+
+        def interrupted(batch_id, *args, **kwargs):
+            raise Interrupted(batch_id)
+
+        expected = outcomes()
+        submitted = len(server.batches)
+        wait_for_batch = openaibatch.wait_for_batch
+        settings.batch_mode = True
+        try:
+            cold()
+            shutil.rmtree("./results", ignore_errors=True)
+            openaibatch.wait_for_batch = interrupted
+            try:
+                stage("get_result_paper_wikigame.py")()
+            except Interrupted:
+                pass
+            openaibatch.wait_for_batch = wait_for_batch
+            pending = os.path.exists(settings.batch_state_path)
+            stage("get_result_paper_wikigame.py")()
+        finally:
+            settings.batch_mode = False
+            openaibatch.wait_for_batch = wait_for_batch
+        batches = list(server.batches.values())[submitted:]
+        return (
+            pending and len(batches) == 1 and batches[0]["status"] == "completed"
+            and batches[0]["request_counts"]["total"] > 0
+            and not os.path.exists(settings.batch_state_path)
+            and outcomes() == expected
+        )
+
+    def validation_parity():
+        """
+        Checks that both modes of validate_paths only report errors that check_error_steps
+        also reports: they may drop its redirect false positives, never add errors.
+        Every human path of the log is checked, as steps from a redirect to its page are rare.
+        """
+        import pathvalidation
+        all_paths = [path.split(" -> ") for path in df_matches["path"].tolist()]
+        expected = [set(check_error_steps(path)) for path in all_paths]
+        mode = pathvalidation.validation_mode
+        try:
+            for validation_mode in ["pltitles", "batch"]:
+                pathvalidation.validation_mode = validation_mode
+                cold()
+                if any(set(errors) - old for errors, old in zip(validate_paths(all_paths), expected)):
+                    return False
+        finally:
+            pathvalidation.validation_mode = mode
+        return True
+
+    checks = {
+        # Both extractors must find the same links on every article
+        "extractor_parity": all(extract_visible_links(text) == extract_visible_links_bs4(text) for text in html),
+        # ... and the expected links on the saved Wikipedia articles of benchmarks/golden
+        "extractor_golden": not check_golden(),
+        "validate_paths_parity": validation_parity(),
+        # Batch mode, resumed after an interruption, must store the records of the synchronous run
+        "batch_mode_parity": batch_mode_parity(),
+        # The bounded selection of the prefetch candidates must return the top of the full sort
+        "rank_candidates_parity": all(rank_candidates(all_titles, end, budget) == full_ranking(end, budget) for end in ends for budget in [1, 3, 8]),
+    }
+    llama_results, llama_checks = run_llama_benchmarks(fixtures_dir, llama_latency, repeat)
+    results.update(llama_results)
+    checks.update(llama_checks)
+    return results, checks
+
+
+def run_llama_benchmarks(fixtures_dir, llama_latency, repeat, num_prompts=64, threads=16):
+    """
+    Times num_prompts LLAMA prompts sent by threads concurrent jobs, micro-batched and one
+    request per prompt, on a stand-in whose every request takes llama_latency seconds.
+    Checks that the batched answers are the single ones, and that an endpoint without batches,
+    or whose batches fail or time out, gets single requests, each batch being sent only once.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from backends import LlamaBackend
+    from llamabatch import MicroBatcher
+    from prompts import context_types
+    from settings import llama_max_requests_in_flight
+
+    with open(os.path.join(fixtures_dir, "llm", "responses.json"), encoding="utf-8") as f:
+        pairs = [key.split("|") for key in json.load(f)]
+    context = context_types[0][1]
+    prompts = [(context, f"Start_Node: {start} - End_Node: {end}") for start, end in (pairs * num_prompts)[:num_prompts]]
+
+    batching_server = StubServer(fixtures_dir, llama_latency=llama_latency).start()
+    plain_server = StubServer(fixtures_dir, llama_latency=llama_latency, llama_batch=False).start()
+    try:
+        batched = LlamaBackend("3.1", endpoint_url=f"{batching_server.url}/llama")
+        single = LlamaBackend("3.1", endpoint_url=f"{batching_server.url}/llama")
+        single.batcher = MicroBatcher(single.send_batch, single.send_single, max_size=1, max_in_flight=llama_max_requests_in_flight)
+        fallback = LlamaBackend("3.1", endpoint_url=f"{plain_server.url}/llama")
+
+        def generate_all(backend):
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                return list(executor.map(lambda prompt: backend.generate(*prompt), prompts))
+
+        results = {
+            "llama_micro_batched": measure(batching_server, lambda: None, lambda: generate_all(batched), repeat, exact_requests=False),
+            "llama_single_requests": measure(batching_server, lambda: None, lambda: generate_all(single), repeat),
+        }
+        expected = generate_all(single)
+        checks = {
+            "llama_batch_parity": generate_all(batched) == expected,
+            "llama_batch_fallback": generate_all(fallback) == expected and not fallback.batcher.batching,
+        }
+        for failure in [500, "timeout"]:
+            checks[f"llama_batch_fallback_{failure}"] = batch_failure_fallback(fixtures_dir, failure, generate_all, expected)
+    finally:
+        batching_server.stop()
+        plain_server.stop()
+    return results, checks
+
+
+def batch_failure_fallback(fixtures_dir, failure, generate_all, expected, batch_timeout=0.5):
+    """
+    Checks that the prompts of an endpoint whose batches fail ("timeout": outlast batch_timeout)
+    are answered one by one, that batching is then turned off, and that no batch is sent twice.
+    """
+    from backends import LlamaBackend
+    from llamabatch import MicroBatcher
+    from settings import llama_max_requests_in_flight
+
+    server = StubServer(fixtures_dir, llama_batch=failure).start()
+    try:
+        backend = LlamaBackend("3.1", endpoint_url=f"{server.url}/llama")
+        sent = []
+
+        def send_batch(prompts):
+            sent.append(len(prompts))
+            return backend.send_batch(prompts, timeout=batch_timeout)
+        backend.batcher = MicroBatcher(send_batch, backend.send_single, max_in_flight=llama_max_requests_in_flight)
+        answers = generate_all(backend)
+        return answers == expected and not backend.batcher.batching and server.counts.get("llama_batch", 0) == len(sent) > 0
+    finally:
+        server.stop()
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, threshold):
+    """
+    Prints the change of every benchmark against the baseline and returns the regressions.
+    """
+    regressions = []
+    if report["fixtures"] != baseline.get("fixtures"):
+        print(f"Warning: the baseline was run on different fixtures {baseline.get('fixtures')}")
+    print(f"\n{'benchmark':<48} {'best base s':>11} {'best s':>9} {'change':>8} {'requests':>12}")
+    for name, result in report["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if base is None:
+            continue
+        # The best time is the least affected by the other load of the machine
+        ratio = result["min_s"] / base["min_s"] if base["min_s"] else float("inf")
+        print(f"{name:<48} {base['min_s']:>11.3f} {result['min_s']:>9.3f} {(ratio - 1) * 100:>+7.1f}% {max(base['requests']):>5} -> {max(result['requests']):<5}")
+        if ratio > 1 + threshold:
+            regressions.append(f"{name} is {(ratio - 1) * 100:.0f}% slower")
+        if result["exact_requests"] and max(result["requests"]) > max(base["requests"]):
+            regressions.append(f"{name} sends {min(result['requests']) - max(base['requests'])} more requests")
+    for name, passed in report["checks"].items():
+        if not passed:
+            regressions.append(f"check {name} failed")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the hot paths of the pipeline.")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions of every benchmark (the best time is compared)")
+    parser.add_argument("--pages", type=int, default=200, help="articles and human paths looked up by the benchmarks")
+    parser.add_argument("--games", type=int, default=3, help="games per difficulty of the end-to-end run (num_game_test)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay added by the stand-in to every response")
+    parser.add_argument("--llama-latency-ms", type=float, default=50, help="generation time of every LLAMA request, batched or not")
+    parser.add_argument("--seed", type=int, default=42, help="seed of the fixtures")
+    parser.add_argument("--output", default=None, help="results file (default benchmarks/results/<time>.json)")
+    parser.add_argument("--compare", default=None, metavar="BASELINE", help="results file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown reported as a regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output or os.path.join(BENCHMARKS_DIR, "results", datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + ".json"))
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    # Everything the pipeline writes (caches, artifacts, results) goes to a scratch directory
+    workdir = tempfile.mkdtemp(prefix="wikigame-bench-")
+    fixtures_dir = os.path.join(workdir, "fixtures")
+    fixtures = make_fixtures(fixtures_dir, seed=args.seed)
+    os.makedirs(os.path.join(workdir, "dataset"))
+    shutil.copy(os.path.join(fixtures_dir, "dataset", "dataset_wiki_game_complete.json"), os.path.join(workdir, "dataset"))
+    print(f"Fixtures: {fixtures}, working directory '{workdir}'")
+
+    server = StubServer(fixtures_dir, latency=args.latency_ms / 1000).start()
+    os.chdir(workdir)
+    try:
+        configure(server, args.games)
+        benchmarks, checks = run_benchmarks(server, fixtures_dir, args.pages, args.repeat, args.llama_latency_ms / 1000)
+    finally:
+        server.stop()
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "fixtures": dict(fixtures, pages_benchmarked=args.pages, games=args.games, latency_ms=args.latency_ms, llama_latency_ms=args.llama_latency_ms),
+        "benchmarks": benchmarks,
+        "checks": checks,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'benchmark':<48} {'median s':>9} {'min s':>9} {'max s':>9} {'requests':>9}")
+    for name, result in benchmarks.items():
+        print(f"{name:<48} {result['median_s']:>9.3f} {result['min_s']:>9.3f} {result['max_s']:>9.3f} {max(result['requests']):>9}")
+    for name, passed in checks.items():
+        print(f"{name}: {'ok' if passed else 'FAILED'}")
+    print(f"Results saved in '{output}'")
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        sys.exit(1 if regressions else 0)
+    sys.exit(0 if all(checks.values()) else 1)
@@ -0,0 +1,333 @@
+"""
+Local stand-in of the services of the pipeline, serving the fixtures of fixtures.py:
+- GET /w/api.php: the Wikipedia API queries of wikigametools (prop=links|categories|redirects
+  with several titles, redirects, pltitles and continuation, and action=parse)
+- GET /wiki/<title>: the rendered articles
+- POST /v1/chat/completions: OpenAI chat completions, with the canned Blind answers and
+  a deterministic choice among the offered links in the Link-Aware requests
+- POST /v1/files, POST /v1/batches, GET /v1/batches/<id> and GET /v1/files/<id>/content: the
+  OpenAI Batch API, answering every request of the input file as /v1/chat/completions does.
+  A batch is in progress on its first status request and completed from the second one
+- POST /llama: the LLAMA endpoint ({"richiesta", "contesto"}), with the same answers, and its
+  batched requests ({"batch": [...]} answered with {"risposte": [...]}). With llama_batch False
+  they are rejected (HTTP 422), with 500 they fail, and with "timeout" they are never answered
+
+Usage: python benchmarks/stubserver.py <fixtures_dir> [port] [latency_ms]
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from hashlib import sha256
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qsl, unquote
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from prompts import parse_link_list
+
+
+# Links returned per API response, as pllimit=max for a normal user; longer lists are continued
+LINKS_PER_RESPONSE = 500
+
+# Seconds a batched LLAMA request hangs with llama_batch = "timeout"
+LLAMA_BATCH_HANG = 5
+
+
+class Fixtures:
+    """
+    Pages, articles and canned answers of a fixtures directory, indexed by title.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, "api", "pages.json"), encoding="utf-8") as f:
+            self.pages = {page["title"]: page for page in json.load(f)}
+        self.html_dir = os.path.join(directory, "html")
+        with open(os.path.join(directory, "llm", "responses.json"), encoding="utf-8") as f:
+            self.responses = json.load(f)
+
+    def html(self, title):
+        page = self.pages.get(title.replace("_", " "))
+        if page is None:
+            return None
+        # A redirect serves the article it points to, as Wikipedia does
+        page = self.pages.get(page.get("redirect"), page)
+        with open(os.path.join(self.html_dir, f"{page['pageid']}.html"), encoding="utf-8") as f:
+            return f.read()
+
+    def query(self, params):
+        """
+        Answers an action=query request like the Wikipedia API.
+        """
+        query = {}
+        titles = params["titles"].split("|")
+        normalized = [{"from": title, "to": title.replace("_", " ")} for title in titles if "_" in title]
+        titles = [title.replace("_", " ") for title in titles]
+        if normalized:
+            query["normalized"] = normalized
+        if params.get("redirects"):
+            redirects = [{"from": title, "to": self.pages[title]["redirect"]} for title in titles if "redirect" in self.pages.get(title, {})]
+            titles = [self.pages[title]["redirect"] if "redirect" in self.pages.get(title, {}) else title for title in titles]
+            if redirects:
+                query["redirects"] = redirects
+
+        props = params.get("prop", "").split("|")
+        wanted = {title.replace("_", " ") for title in params["pltitles"].split("|")} if "pltitles" in params else None
+        # Continuation of the links: index of the page and of its first link not returned yet
+        first_page, first_link = (int(value) for value in params.get("plcontinue", "0|0").split("|"))
+        budget = LINKS_PER_RESPONSE
+        pages = {}
+        continuation = None
+        for i, title in enumerate(dict.fromkeys(titles)):
+            page = self.pages.get(title)
+            if page is None:
+                pages[str(-i - 1)] = {"ns": 0, "title": title, "missing": ""}
+                continue
+            record = {"pageid": page["pageid"], "ns": 0, "title": title}
+            if "redirect" in page:
+                record["redirect"] = ""
+            if "links" in props and i >= first_page and continuation is None:
+                links = [link for link in page["links"] if wanted is None or link in wanted]
+                start = first_link if i == first_page else 0
+                chunk = links[start:start + budget]
+                budget -= len(chunk)
+                if start + len(chunk) < len(links):
+                    continuation = f"{i}|{start + len(chunk)}"
+                if chunk:
+                    record["links"] = [{"ns": 0, "title": link} for link in chunk]
+            # Other properties are returned with the first response only
+            if "categories" in props and page["categories"] and "plcontinue" not in params:
+                record["categories"] = [{"ns": 14, "title": category} for category in page["categories"]]
+            if "redirects" in props and page["redirects"]:
+                record["redirects"] = [{"ns": 0, "title": redirect} for redirect in page["redirects"]]
+            pages[str(page["pageid"])] = record
+        query["pages"] = pages
+
+        data = {"batchcomplete": ""} if continuation is None else {"continue": {"plcontinue": continuation, "continue": "||"}}
+        data["query"] = query
+        return data
+
+    def parse(self, params):
+        html = self.html(params["page"])
+        if html is None:
+            return {"error": {"code": "missingtitle", "info": "The page you specified doesn't exist."}}
+        return {"parse": {"title": params["page"].replace("_", " "), "text": {"*": html}}}
+
+    def answer(self, request):
+        """
+        Returns the model answer to a user request: the canned path of a Blind request, or
+        for a Link-Aware request the goal when offered and otherwise a link chosen by a hash
+        of the request, so that the same request always gets the same answer.
+        """
+        start, end = re.match(r"Start_Node: (.*) - End_Node: (.*)", request.split("\n")[0]).groups()
+        if "List_Link_From_Start_Node:" not in request:
+            path = self.responses.get(f"{start}|{end}", [start, end])
+            return "###\n" + " -> ".join(path) + "\n@@@"
+        links = parse_link_list(request.split("List_Link_From_Start_Node:\n", 1)[1])
+        if end in links or not links:
+            choice = end
+        else:
+            choice = links[int(sha256(request.encode("utf-8")).hexdigest(), 16) % len(links)]
+        return f"###\n{choice}\n@@@"
+
+    def completion(self, body):
+        """
+        Returns the chat completion object answering an OpenAI request body.
+        """
+        text = self.answer(body["messages"][-1]["content"])
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(json.dumps(body["messages"])) // 4, "completion_tokens": len(text) // 4, "prompt_tokens_details": {"cached_tokens": 0}}
+        }
+
+
+def parse_multipart(content_type, body):
+    """
+    Returns the fields of a multipart/form-data body as a dict of name: bytes.
+    """
+    message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body)
+    return {part.get_param("name", header="content-disposition"): part.get_payload(decode=True) for part in message.iter_parts()}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Set on the subclass created by each StubServer
+    fixtures = None
+    latency = 0
+    llama_latency = 0
+    llama_batch = True
+    counts = None
+    counts_lock = None
+    # Uploaded files and batches of the Batch API, by ID, and the status requests of each batch
+    files = None
+    batches = None
+    batch_polls = None
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status, body, content_type):
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def count(self, route):
+        with self.counts_lock:
+            self.counts[route] = self.counts.get(route, 0) + 1
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.startswith("/wiki/"):
+            self.count("wiki")
+            html = self.fixtures.html(unquote(url.path[len("/wiki/"):]))
+            if html is None:
+                self.send(404, b"Not Found", "text/html")
+            else:
+                self.send(200, html.encode("utf-8"), "text/html; charset=UTF-8")
+        elif url.path == "/w/api.php":
+            self.count("api")
+            params = dict(parse_qsl(url.query))
+            data = self.fixtures.parse(params) if params.get("action") == "parse" else self.fixtures.query(params)
+            self.send(200, json.dumps(data).encode("utf-8"), "application/json")
+        elif url.path.startswith("/v1/batches/"):
+            self.count("openai_batch")
+            batch = self.batches.get(url.path[len("/v1/batches/"):])
+            if batch is None:
+                self.send(404, b'{"error": {"message": "No such batch"}}', "application/json")
+                return
+            with self.counts_lock:
+                self.batch_polls[batch["id"]] += 1
+                if self.batch_polls[batch["id"]] > 1 and batch["status"] == "in_progress":
+                    self.run_batch(batch)
+            self.send(200, json.dumps(batch).encode("utf-8"), "application/json")
+        elif re.fullmatch(r"/v1/files/[^/]+/content", url.path):
+            self.count("openai_batch")
+            content = self.files.get(url.path.split("/")[3])
+            if content is None:
+                self.send(404, b'{"error": {"message": "No such file"}}', "application/json")
+            else:
+                self.send(200, content, "application/jsonl")
+        else:
+            self.send(404, b"Not Found", "text/plain")
+
+    def run_batch(self, batch):
+        """
+        Answers every request of the input file of the batch into its output file and completes it.
+        """
+        lines = []
+        for line in self.files[batch["input_file_id"]].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            response = {"status_code": 200, "request_id": f"req-{request['custom_id']}", "body": self.fixtures.completion(request["body"])}
+            lines.append(json.dumps({"id": f"batch_req-{len(lines)}", "custom_id": request["custom_id"], "response": response, "error": None}))
+        output_file_id = f"file-output-{batch['id']}"
+        self.files[output_file_id] = ("\n".join(lines) + "\n").encode("utf-8")
+        batch.update({
+            "status": "completed",
+            "output_file_id": output_file_id,
+            "request_counts": {"total": len(lines), "completed": len(lines), "failed": 0}
+        })
+
+    def do_POST(self):
+        content = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/v1/files":
+            self.count("openai_batch")
+            fields = parse_multipart(self.headers["Content-Type"], content)
+            with self.counts_lock:
+                file_id = f"file-{len(self.files)}"
+                self.files[file_id] = fields["file"]
+            data = {"id": file_id, "object": "file", "bytes": len(fields["file"]), "purpose": fields["purpose"].decode("utf-8")}
+            self.send(200, json.dumps(data).encode("utf-8"), "application/json")
+            return
+        body = json.loads(content)
+        if self.path == "/v1/chat/completions":
+            self.count("openai")
+            self.send(200, json.dumps(self.fixtures.completion(body)).encode("utf-8"), "application/json")
+        elif self.path == "/v1/batches":
+            self.count("openai_batch")
+            if body["input_file_id"] not in self.files:
+                self.send(400, b'{"error": {"message": "No such file"}}', "application/json")
+                return
+            with self.counts_lock:
+                batch = {
+                    "id": f"batch-{len(self.batches)}",
+                    "object": "batch",
+                    "endpoint": body["endpoint"],
+                    "input_file_id": body["input_file_id"],
+                    "completion_window": body["completion_window"],
+                    "status": "in_progress",
+                    "request_counts": {"total": 0, "completed": 0, "failed": 0}
+                }
+                self.batches[batch["id"]] = batch
+                self.batch_polls[batch["id"]] = 0
+            self.send(200, json.dumps(batch).encode("utf-8"), "application/json")
+        elif self.path == "/llama":
+            self.count("llama" if "batch" not in body else "llama_batch")
+            # Generation time of the GPU, the same for one prompt or a whole batch
+            time.sleep(self.llama_latency)
+            if "batch" not in body:
+                self.send(200, self.fixtures.answer(body["richiesta"]).encode("utf-8"), "text/plain; charset=UTF-8")
+            elif self.llama_batch is False:
+                self.send(422, b'{"detail": "field required: richiesta"}', "application/json")
+            elif self.llama_batch == 500:
+                self.send(500, b'{"detail": "CUDA out of memory"}', "application/json")
+            elif self.llama_batch == "timeout":
+                # Stuck generation: the client gives up first, and the connection is closed unanswered
+                time.sleep(LLAMA_BATCH_HANG)
+            else:
+                answers = [self.fixtures.answer(prompt["richiesta"]) for prompt in body["batch"]]
+                self.send(200, json.dumps({"risposte": answers}).encode("utf-8"), "application/json")
+        else:
+            self.send(404, b"Not Found", "text/plain")
+
+
+class StubServer:
+    """
+    Runs the stand-in on a local port in a background thread. counts holds the number of
+    requests served by route (api, wiki, openai, openai_batch, llama, llama_batch). latency delays
+    every response and llama_latency is the generation time of every LLAMA request, batched or not.
+    llama_batch is True, or how batched LLAMA requests fail: False (rejected), 500 or "timeout".
+    batches holds the batches created through the Batch API, by ID.
+    """
+
+    def __init__(self, fixtures_dir, port=0, latency=0, llama_latency=0, llama_batch=True):
+        self.counts = {}
+        self.batches = {}
+        handler = type("Handler", (StubHandler,), {
+            "fixtures": Fixtures(fixtures_dir), "latency": latency, "llama_latency": llama_latency, "llama_batch": llama_batch,
+            "counts": self.counts, "counts_lock": threading.Lock(),
+            "files": {}, "batches": self.batches, "batch_polls": {}
+        })
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8080
+    latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0
+    server = StubServer(sys.argv[1], port, latency).start()
+    print(f"Serving the fixtures of '{sys.argv[1]}' on {server.url} (Ctrl+C to stop)")
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
@@ -1,11 +1,22 @@
+import os
 import pandas as pd
+import numpy as np
 import json
+from artifacts import MATCHES_PATH, STATISTICS_PATH, read_matches, read_statistics
+
+# Difficulty of a pair from the human win percentage: MEDIUM 50-75, HARD 25-49, VERY_HARD 1-24,
+# IMPOSSIBLE below 1, anything else is skipped. The bins are closed on the left, and the upper
+# bounds are moved just above 24, 49 and 75 so that those values are included.
+DIFFICULTY_BINS = [-np.inf, 1, np.nextafter(24, np.inf), 25, np.nextafter(49, np.inf), 50, np.nextafter(75, np.inf), np.inf]
+DIFFICULTY_LABELS = ["IMPOSSIBLE", "VERY_HARD", "SKIP", "HARD", "SKIP", "MEDIUM", "SKIP"]
 
-def classify_games_by_difficulty(excel_file_path):
-    # Load the Excel sheets
-    df_games = pd.read_excel(excel_file_path, sheet_name="All Game")
-    df_stats = pd.read_excel(excel_file_path, sheet_name="Statistics")
 
+def classify_pairs(df_games, df_stats):
+    """
+    Groups the start--goal pairs of df_stats by difficulty and attaches to each pair
+    the human paths of df_games, with one pd.cut for the difficulty and one groupby
+    for the paths of all pairs.
+    """
     # Final dictionary organized by difficulty
     result = {
         "MEDIUM": [],
@@ -14,52 +25,54 @@ def classify_games_by_difficulty(excel_file_path):
         "IMPOSSIBLE": []
     }
 
-    # Iterate over each row of the "Statistics" sheet
-    for _, row in df_stats.iterrows():
-        from_node = row["from_node"]
-        to_node = row["to_node"]
-        win_percentage = row["win_percentage"]
-        avg_human_step_to_win = row["avg_steps_to_win"]
-
-        # Determine the difficulty category
-        if 50 <= win_percentage <= 75:
-            difficulty = "MEDIUM"
-        elif 25 <= win_percentage <= 49:
-            difficulty = "HARD"
-        elif 1 <= win_percentage <= 24:
-            difficulty = "VERY_HARD"
-        elif win_percentage < 1:  # win_percentage == 0
-            difficulty = "IMPOSSIBLE"
-        else:
-            difficulty = "SKIP"
-        
-        if difficulty != "SKIP":
-            # Filter the corresponding games in "All Game"
-            filtered_games = df_games[
-                (df_games["from_node"] == from_node) & (df_games["to_node"] == to_node)
-            ]
-
-            # Extract path and won for each game
-            list_path_user_with_result = [
-                (row_game["path"], bool(row_game["won"])) 
-                for _, row_game in filtered_games.iterrows()
-            ]
+    # Determine the difficulty category of every pair
+    difficulty = pd.cut(df_stats["win_percentage"], bins=DIFFICULTY_BINS, labels=DIFFICULTY_LABELS, right=False, ordered=False)
+    difficulty = difficulty.astype(object).where(difficulty.notna(), "SKIP")
 
+    # Extract path and won for each game, and the positions of the games of each pair
+    path_with_result = list(zip(df_games["path"].tolist(), [bool(won) for won in df_games["won"].tolist()]))
+    games_by_pair = df_games.groupby(["from_node", "to_node"], sort=False).indices
+
+    for from_node, to_node, avg_human_step_to_win, pair_difficulty in zip(
+        df_stats["from_node"].tolist(),
+        df_stats["to_node"].tolist(),
+        df_stats["avg_steps_to_win"].tolist(),
+        difficulty.tolist()
+    ):
+        if pair_difficulty != "SKIP":
             # Build the block for the pair to insert in the dictionary
             game_entry = {
                 "start_node": from_node,
                 "end_node": to_node,
                 "avg_human_step_to_win": avg_human_step_to_win,
-                "list_path_user_with_result": list_path_user_with_result
+                "list_path_user_with_result": [path_with_result[i] for i in games_by_pair.get((from_node, to_node), [])]
             }
 
-            result[difficulty].append(game_entry)
+            result[pair_difficulty].append(game_entry)
 
     return result
 
-# Create the dataset for the paper
-json_result = classify_games_by_difficulty("./statistics/wikigame_statistics.xlsx")
 
-# Save the dataset in a JSON file
-with open("./dataset/dataset_paper.json", "w") as f:
-    json.dump(json_result, f, indent=2)
+def classify_games_by_difficulty(excel_file_path):
+    # Load the Excel sheets
+    df_games = pd.read_excel(excel_file_path, sheet_name="All Matches")
+    df_stats = pd.read_excel(excel_file_path, sheet_name="Statistics")
+
+    return classify_pairs(df_games, df_stats)
+
+
+def classify_games_by_difficulty_parquet(matches_path=MATCHES_PATH, statistics_path=STATISTICS_PATH):
+    # Load the typed Parquet artifacts of the statistics stage
+    return classify_pairs(read_matches(matches_path), read_statistics(statistics_path))
+
+
+if __name__ == "__main__":
+    # Create the dataset for the paper, from the Parquet artifacts when available
+    if os.path.exists(MATCHES_PATH) and os.path.exists(STATISTICS_PATH):
+        json_result = classify_games_by_difficulty_parquet()
+    else:
+        json_result = classify_games_by_difficulty("./statistics/wikigame_statistics.xlsx")
+
+    # Save the dataset in a JSON file
+    with open("./dataset/dataset_paper.json", "w") as f:
+        json.dump(json_result, f, indent=2)
@@ -0,0 +1,89 @@
+import os
+import threading
+from functools import lru_cache
+
+from settings import distance_graph_path, link_graph_path, oracle_cache_graph_path, distance_maps_memo_size
+from wikigraph import load_link_graph
+
+
+def load_distance_graph():
+    """
+    Returns the link graph used for the distances to the goal, or None if no graph is available.
+    """
+    if distance_graph_path is not None:
+        return load_link_graph(distance_graph_path)
+    if link_graph_path is not None:
+        from wikigametools import link_graph
+        return link_graph
+    if os.path.isdir(oracle_cache_graph_path):
+        return load_link_graph(oracle_cache_graph_path)
+    return None
+
+
+distance_graph = load_distance_graph()
+
+# One lock per end node, so that concurrent jobs of the same game compute its map only once
+distance_map_locks = {}
+
+
+def get_distance_map(end):
+    """
+    Returns the hops from every page to end (reverse BFS on the distance graph), computed once
+    per end node and shared by all the models playing that game. None if no graph is available.
+    """
+    if distance_graph is None:
+        return None
+    with distance_map_locks.setdefault(end, threading.Lock()):
+        return compute_distance_map(end)
+
+
+@lru_cache(maxsize=distance_maps_memo_size)
+def compute_distance_map(end):
+    return distance_graph.distances_to(end)
+
+
+def distance_to_goal(distances, title):
+    """
+    Returns the hops from title to the end node of the distance map, or None if unknown.
+    """
+    if distances is None:
+        return None
+    return distance_graph.distance_to(distances, title)
+
+
+def trace_step(distances, current, links, choice, answer=None):
+    """
+    Returns the trace of a single Link-Aware choice: the distance to the goal before and
+    after the move, whether the move reduced it, and how many of the offered links
+    were at the smallest distance to the goal. Values that cannot be computed are None.
+    answer is the title as written by the model, before it was matched to the offered links.
+    """
+    distance_before = distance_to_goal(distances, current)
+    distance_after = distance_to_goal(distances, choice)
+    link_distances = [distance_to_goal(distances, link) for link in links]
+    known = [distance for distance in link_distances if distance is not None]
+    best = min(known) if known else None
+    return {
+        "page": current,
+        "choice": choice,
+        "answer": answer if answer is not None else choice,
+        "distance_before": distance_before,
+        "distance_after": distance_after,
+        "reduced_distance": distance_after < distance_before if distance_before is not None and distance_after is not None else None,
+        "num_links": len(links),
+        "num_optimal_links": link_distances.count(best) if best is not None else None,
+        "optimal_choice": distance_after == best if best is not None else None
+    }
+
+
+def summarize_trace(trace):
+    """
+    Returns the number of moves that reduced the distance to the goal and of optimal choices,
+    None when no distance is known for the episode (no graph, or none of its pages in the graph).
+    """
+    if not any(step["distance_before"] is not None or step["distance_after"] is not None for step in trace):
+        return None, None
+    return (
+        sum(bool(step["reduced_distance"]) for step in trace),
+        sum(bool(step["optimal_choice"]) for step in trace)
+    )
@@ -0,0 +1,36 @@
+import json
+import os
+import pandas as pd
+from artifacts import PATH_DISTANCES_PATH, HUMAN_VALIDATION_PATH, read_path_distances, read_human_validation
+from get_result_paper_wikigame import build_jobs, job_key
+from resultstore import merged_records, record_key
+from settings import results_store_path
+
+f = open("./dataset/dataset_paper.json", "r")
+dataset_game = json.load(f)
+f.close()
+
+# Merge the store and the stores of all the shards, ordering the records as the jobs of the sweep
+# (any other record goes last)
+job_order = {job_key(job): i for i, job in enumerate(build_jobs(dataset_game))}
+records = merged_records(results_store_path)
+records.sort(key=lambda record: job_order.get(record_key(record), len(job_order)))
+
+# Create DataFrame and save in Excel and Parquet
+df = pd.DataFrame(records)
+# Attach the shortest-path baseline and the optimality gap when the oracle stage has been run
+if os.path.exists(PATH_DISTANCES_PATH) and not df.empty:
+    df = df.merge(read_path_distances(), how="left", on=["game_mode", "game_num", "model_name", "version_model", "type_context"])
+# Put the validation of the human paths of each pair next to the human average, when available
+if os.path.exists(HUMAN_VALIDATION_PATH) and not df.empty:
+    human_validation = read_human_validation().rename(columns={"from_node": "start_node", "to_node": "end_node"})
+    df = df.merge(human_validation, how="left", on=["start_node", "end_node"])
+    columns = [column for column in df.columns if column not in human_validation.columns[2:]]
+    position = columns.index("avg_human_step_to_win") + 1
+    df = df[columns[:position] + list(human_validation.columns[2:]) + columns[position:]]
+df.to_excel("./results/results_wikigame.xlsx", index=False)
+# In Parquet the human average is numeric, "N/A" becomes null
+df_parquet = df.assign(avg_human_step_to_win=pd.to_numeric(df["avg_human_step_to_win"], errors="coerce"))
+df_parquet.to_parquet("./results/results_wikigame.parquet", index=False)
+
+print(f"Exported {len(df)} records to './results/results_wikigame.xlsx' and './results/results_wikigame.parquet'")
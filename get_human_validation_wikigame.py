@@ -0,0 +1,79 @@
+from multiprocessing import Pool
+
+from artifacts import HUMAN_VALIDATION_PATH, HUMAN_VALIDATION_SCHEMA, ParquetTableWriter, read_matches
+from httpclient import http_client
+from pathvalidation import pairwise
+from settings import human_validation_processes, human_validation_chunk_size, link_graph_path, cache_path, oracle_cache_graph_path
+from wikigametools import check_links_batch
+from wikigraph import WikiGraph
+
+
+def init_worker(processes):
+    # Each process has its own HTTP client: split the host rate limits among them
+    http_client.requests_per_minute = {host: rate / processes for host, rate in http_client.requests_per_minute.items() if rate}
+
+
+def edge_chunks(edges, chunk_size):
+    """
+    Splits the distinct edges into chunks, keeping the edges of the same source page together
+    so that each worker asks about a source page only once.
+    """
+    by_source = {}
+    for prev, next in edges:
+        by_source.setdefault(prev, []).append((prev, next))
+    chunk = []
+    for source_edges in by_source.values():
+        chunk.extend(source_edges)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+if __name__ == "__main__":
+    df_matches = read_matches()
+    paths_by_pair = {}
+    for from_node, to_node, path in zip(df_matches["from_node"].tolist(), df_matches["to_node"].tolist(), df_matches["path"].tolist()):
+        paths_by_pair.setdefault((from_node, to_node), []).append(path.split(" -> "))
+
+    # Players share most of their edges, so each distinct edge is checked only once (and then cached)
+    edges = list(dict.fromkeys(edge for paths in paths_by_pair.values() for path in paths for edge in pairwise(path)))
+    print(f"{sum(len(paths) for paths in paths_by_pair.values())} human paths, {len(edges)} distinct edges to check")
+
+    statuses = {}
+    with Pool(processes=human_validation_processes, initializer=init_worker, initargs=(human_validation_processes,)) as pool:
+        for result in pool.imap_unordered(check_links_batch, edge_chunks(edges, human_validation_chunk_size)):
+            statuses.update(result)
+            print(f"{len(statuses)}/{len(edges)} edges checked")
+
+    with ParquetTableWriter(HUMAN_VALIDATION_PATH, HUMAN_VALIDATION_SCHEMA) as writer:
+        for (from_node, to_node), paths in paths_by_pair.items():
+            valid_paths = num_no_link = num_no_page = num_redirect = 0
+            for path in paths:
+                path_statuses = [statuses[edge] for edge in pairwise(path)]
+                num_no_link += path_statuses.count("NO LINK")
+                num_no_page += path_statuses.count("NO PAGE")
+                num_redirect += path_statuses.count("REDIRECT")
+                if "NO LINK" not in path_statuses and "NO PAGE" not in path_statuses:
+                    valid_paths += 1
+            writer.write({
+                "from_node": from_node,
+                "to_node": to_node,
+                "human_num_paths": len(paths),
+                "human_valid_paths": valid_paths,
+                "human_valid_path_percentage": round(valid_paths / len(paths) * 100, 2),
+                "human_num_no_link": num_no_link,
+                "human_num_no_page": num_no_page,
+                "human_num_redirect": num_redirect
+            })
+
+    print(f"Validation of the human paths saved in '{HUMAN_VALIDATION_PATH}'")
+
+    # Without an offline graph, the edges just checked are the graph of the distances to the goal
+    # of the experiments, until the shortest-path stage rebuilds it with the model paths too
+    if link_graph_path is None:
+        graph = WikiGraph.from_link_cache(cache_path)
+        graph.save(oracle_cache_graph_path)
+        graph.save_navigation(oracle_cache_graph_path)
+        print(f"Link graph of the cache ({len(graph)} pages, {graph.num_links} links) saved in '{oracle_cache_graph_path}'")
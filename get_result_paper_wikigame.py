@@ -1,126 +1,36 @@
-import requests
+import argparse
 import json
-from wikigametools import get_internal_links_from_article, get_all_visible_existing_internal_links
-import pandas as pd
-from time import sleep
-from prompts import context_with_think_last, context_with_think, context_no_think, context_types
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from linkprefetch import link_prefetcher
+from pathvalidation import validate_paths, count_error_steps
+from distancetracking import get_distance_map, trace_step, summarize_trace
+from prompts import context_types, format_link_list, decode_link_choice
 from models import list_model
-from api_key import GPT_API_KEY, LLAMA_ENDPOINT_URL
-from settings import num_game_test, max_steps_try
+from settings import num_game_test, max_steps_try, max_workers, provider_max_concurrency, provider_requests_per_minute, provider_tokens_per_minute
+from settings import results_store_path, link_termination_policies
+from settings import batch_mode, batch_contexts, batch_requests_path, batch_state_path
+from ratelimit import TokenBucket
+from resultstore import ResultStore, merged_records, parse_shard, shard_keys, shard_path, record_key
+from metrics import metrics
+from backends import get_backend, record_usage
+from responsecache import response_cache, response_key
+from openaibatch import batch_request_line, write_batch_requests, submit_batch, wait_for_batch, batch_results
 
 
-def pairwise(iterable):
-    """
-    Yields consecutive pairs from the given iterable.
-    Example: pairwise('ABCDEFG') → AB, BC, CD, DE, EF, FG
-    """
-    iterator = iter(iterable)
-    a = next(iterator, None)
-
-    for b in iterator:
-        yield a, b
-        a = b
-
-def call_gpt(context, request, model):
-    """
-    Calls the OpenAI GPT API with the provided context, request, and model.
-    Parses the response to extract a list of steps (Wikipedia page titles).
-    Retries on failure.
-    """
-    while True:
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": GPT_API_KEY
-        }
-        data = {
-            "model": model,
-            "seed": 42,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": context
-                },
-                {
-                    "role": "user",
-                    "content": request
-                }
-            ]
-        }
-
-        response = requests.post(url, headers=headers, json=data)
-        response_json = response.json()
-        if 'choices' in response_json:
-            text = response.json()['choices'][0]['message']['content']
-            text_list_steps = text[text.find("###")+len("###"):].strip()
-            if "@@@" in text_list_steps:
-                text_list_steps = text_list_steps[:text_list_steps.find("@@@")].strip()
-            list_steps = []
-            for step in text_list_steps.split(" -> "):
-                if step not in list_steps:
-                    list_steps.append(step.strip().replace(" ", "_"))
-            return list_steps
-        else:
-            sleep(2)
-            continue
-
-
-def call_gpt_link(context, request, model):
-    """
-    Calls the OpenAI GPT API with the provided context, request, and model.
-    Parses the response to extract a list of steps (Wikipedia page titles).
-    Retries on failure.
-    """
-    while True:
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": GPT_API_KEY
-        }
-        data = {
-            "model": model,
-            "seed": 42,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": context
-                },
-                {
-                    "role": "user",
-                    "content": request
-                }
-            ]
-        }
-
-        response = requests.post(url, headers=headers, json=data)
-        response_json = response.json()
-        if 'choices' in response_json:
-            text = response.json()['choices'][0]['message']['content']
-            text_step = text[text.find("###")+len("###"):].strip()
-            if "@@@" in text_step:
-                text_step = text_step.split("@@@")[0].strip()
-            return text_step
-        else:
-            sleep(2)
-            continue
+# Per-provider concurrency limits and request/token rate limits
+provider_slots = {provider: threading.BoundedSemaphore(limit) for provider, limit in provider_max_concurrency.items()}
+provider_request_buckets = {provider: TokenBucket(rate) for provider, rate in provider_requests_per_minute.items()}
+provider_token_buckets = {provider: TokenBucket(rate) for provider, rate in provider_tokens_per_minute.items()}
 
 
-def call_llama(context, request):
+def parse_steps(text):
     """
-    Calls the LLAMA endpoint with the provided context and request.
-    Parses the response to extract a list of steps (Wikipedia page titles).
+    Parses the answer of a Blind context: the path after ### (and before @@@, if any)
+    as a list of steps (Wikipedia page titles).
     """
-    url = LLAMA_ENDPOINT_URL
-    headers = {
-        "Content-Type": "application/json"
-    }
-    data = {
-        "richiesta": request,
-        "contesto": context
-    }
-
-    response = requests.post(url, headers=headers, data=json.dumps(data), timeout=60)
-    text = response.text
     text_list_steps = text[text.find("###")+len("###"):].strip()
     if "@@@" in text_list_steps:
         text_list_steps = text_list_steps[:text_list_steps.find("@@@")].strip()
@@ -130,168 +40,440 @@ def call_llama(context, request):
             list_steps.append(step.strip().replace(" ", "_"))
     return list_steps
 
-def call_llama_link(context, request):
+
+def parse_link_step(text):
     """
-    Calls the LLAMA endpoint with the provided context and request.
-    Parses the response to extract a list of steps (Wikipedia page titles).
+    Parses the answer of the Link-Aware context: the page chosen between ### and @@@.
     """
-    url = LLAMA_ENDPOINT_URL
-    headers = {
-        "Content-Type": "application/json"
-    }
-    data = {
-        "richiesta": request,
-        "contesto": context
-    }
-
-    response = requests.post(url, headers=headers, data=json.dumps(data), timeout=60)
-    text = response.text
     text_step = text[text.find("###")+len("###"):].strip()
     if "@@@" in text_step:
         text_step = text_step.split("@@@")[0].strip()
     return text_step
 
 
-def check_error_steps(list_steps):
+def sum_usage(usage, field):
     """
-    Checks the validity of each step in the provided list of steps.
-    Returns a list of errors found in the path (e.g., missing links or pages).
+    Returns the total of a usage field over the calls, or None if no call reported it.
     """
-    list_steps_after = []
-    list_error = []
-    for prev, next in pairwise(list_steps):
-        step=prev
-        list_link_page = get_internal_links_from_article(prev)
-        if list_link_page == False:
-            continue
-        else:
-            if list_link_page == []:
-                list_error.append(f"NO PAGE: {prev}")
-            else:
-                if next in list_link_page:
-                    continue
-                else:
-                    list_error.append(f"NO LINK: {prev} -> {next}")
-        list_steps_after.append(step)
-    return list_error
-
-
-def count_error_steps(error_steps):
-    """
-    Counts the number of different types of errors in the error_steps list.
-    Returns the counts for missing links, missing pages, and disambiguation pages.
-    """
-    num_no_link = 0
-    num_no_page = 0
-    num_dis_page = 0
-    for error in error_steps:
-        if "NO LINK:" in error:
-            num_no_link += 1
-        elif "NO PAGE:" in error:
-            num_no_page += 1
-        else:
-            num_dis_page += 1
-    return num_no_link, num_no_page, num_dis_page
+    values = [call[field] for call in usage if call[field] is not None]
+    return sum(values) if values else None
 
 
-if __name__ == "__main__":
-    f = open("./dataset/dataset_paper.json", "r")
-    dataset_game = json.load(f)
-    f.close()
+@contextmanager
+def provider_limits(backend, context, request):
+    """
+    Holds a concurrency slot of the provider of the backend, after waiting for its request and token rate limits.
+    """
+    provider = backend.provider
+    # Time spent waiting for the provider limits, measured apart from the call itself
+    with metrics.measure("model_rate_limit_wait", model=backend.version):
+        # Rough estimate of the prompt tokens (about 4 characters per token)
+        provider_token_buckets[provider].acquire((len(context) + len(request)) // 4)
+        provider_request_buckets[provider].acquire()
+        provider_slots[provider].acquire()
+    try:
+        yield
+    finally:
+        provider_slots[provider].release()
 
-    # Placeholder for results
-    results = []
 
-    # Iterate over all game modes and games
-    s = 0
+def call_model(model, context, request, link=False, usage=None):
+    """
+    Calls the backend of the given model through the response cache, respecting the concurrency and rate
+    limits of its provider for the calls not served by the cache. If link is True, returns the single page
+    chosen in the Link-Aware context, otherwise the list of steps.
+    The token usage of the call is appended to usage, if given.
+    """
+    backend = get_backend(model)
+    call_usage = []
+    with metrics.measure("model_call", model=backend.version):
+        text = response_cache.generate(backend, context, request, call_usage, limits=provider_limits(backend, context, request))
+        # Only the tokens actually paid for, not those of answers served by the response cache
+        paid = [call for call in call_usage if not call.get("response_cache")]
+        metrics.add(
+            prompt_tokens=sum(call["prompt_tokens"] or 0 for call in paid),
+            completion_tokens=sum(call["completion_tokens"] or 0 for call in paid)
+        )
+    if usage is not None:
+        usage.extend(call_usage)
+    return parse_link_step(text) if link else parse_steps(text)
+
+
+def build_jobs(dataset_game):
+    """
+    Expands the dataset into the list of independent (game_mode, game, context_type, model) jobs,
+    in the same order as the results are written.
+    """
+    jobs = []
     # Iterate over all game modes and games
     for game_mode, game_list in dataset_game.items():
         # Iterate over all games
         for game_num, game in enumerate(game_list[:num_game_test]):
-            # Get the start and end nodes
-            start = game["start_node"]
-            end = game["end_node"]
-            request = f"Start_Node: {start} - End_Node: {end}"
-            # Get the average human step to win
-            avg_human_step_to_win = game["avg_human_step_to_win"]
-            # Initialize the human paths string
-            human_paths = ""
-            # Get the list of human paths with result
-            list_path_user_with_result = game["list_path_user_with_result"]
-            # Iterate over all human paths
-            for path_user in list_path_user_with_result:
-                # If the path is correct, we add it to the human paths string
-                if path_user[1] == True:
-                    # Add the path to the human paths string with the @#@ separator for an human readable format
-                    human_paths += path_user[0] +" @#@\n"
             # Iterate over all context types
             for context_type in context_types:
-                context = context_type[1]
-                for model in list_model: 
-                    # If the context type is not LINK, we use the normal context
-                    if context_type[0] != "LINK":
-                        if model[0] == "GPT":
-                            steps = call_gpt(context, request, model[1])
-                        elif model[0] == "LLAMA":
-                            steps = call_llama(context, request)
-                    # If the context type is LINK, we use the link context
-                    else:
-                        # Initialize the steps list with the start node
-                        steps = [start]
-                        # Create the request for the link context
-                        request_link = f"Start_Node: {start} - End_Node: {end}\n\nList_Link_From_Start_Node:\n{str(get_all_visible_existing_internal_links(start, steps))}"
-                        # Call the model to get the next step
-                        if model[0] == "GPT":
-                            new_step = call_gpt_link(context, request_link, model[1])
-                        elif model[0] == "LLAMA":
-                            new_step = call_llama_link(context, request_link)
-                        steps.append(new_step)
-                        # While the last step is not the end node and the number of steps is less than the maximum number of steps, we call the model to get the next step
-                        while steps[-1].lower() != end.lower() and len(steps) < max_steps_try:
-                            # Create the request for the link context
-                            request_link = f"Start_Node: {new_step} - End_Node: {end}\n\nList_Link_From_Start_Node:\n{str(get_all_visible_existing_internal_links(new_step, steps))}"
-                            # Call the model to get the next step
-                            if model[0] == "GPT":
-                                new_step = call_gpt_link(context, request_link, model[1])
-                            elif model[0] == "LLAMA":
-                                new_step = call_llama_link(context, request_link)
-                            steps.append(new_step)
-                    # Try to check the errors in the steps
-                    try:
-                        # Check the errors in the steps
-                        errors = check_error_steps(steps)
-                        # Count the number of errors
-                        num_no_link, num_no_page, num_dis_page = count_error_steps(errors)
-                    # If there is an error, we set the errors to NO CORRECT PATH
-                    except:
-                        errors = ["NO CORRECT PATH"]
-                        num_no_link=0
-                        num_no_page=0
-                        num_dis_page=0
-                    # Check if the path is complete
-                    complete_path = "True" if end in steps else "False"
-                    # Append the results to the list
-                    results.append({
+                for model in list_model:
+                    jobs.append({
                         "game_mode": game_mode,
                         "game_num": game_num,
-                        "model_name": model[0],
-                        "version_model": model[1],
-                        "type_context": context_type[0],
-                        "inference_mode": "UNSUPERVISED",
-                        "start_node": start,
-                        "end_node": end,
-                        "steps": " ->\n".join(steps),
-                        "errors": errors,
-                        "num_no_link": num_no_link,
-                        "num_no_page": num_no_page,
-                        "num_dis_page": num_dis_page,
-                        "complete_path": complete_path,
-                        "avg_human_step_to_win": avg_human_step_to_win,
-                        "human_paths": human_paths
+                        "game": game,
+                        "context_type": context_type,
+                        "model": model
                     })
+    return jobs
+
+
+def job_key(job):
+    """
+    Returns the key of a job, the same returned by resultstore.record_key for its record.
+    """
+    return (job["game_mode"], job["game_num"], job["model"][0], job["model"][1], job["context_type"][0])
+
+
+# Formatting models add around a title, ignored when matching it: quotes, emphasis and trailing punctuation
+CHOICE_QUOTES = "'\"`*“”‘’"
+CHOICE_TRAILING = ".,;:!"
+
+
+def casefold_title(title):
+    """
+    Returns the key a title is matched on case-insensitively, with spaces and underscores the same.
+    """
+    return "_".join(title.replace("_", " ").split()).casefold()
+
+
+def normalize_choice(title):
+    """
+    Returns the key of casefold_title without surrounding quotes and emphasis and trailing punctuation.
+    """
+    return casefold_title(title.strip(CHOICE_QUOTES + " ").rstrip(CHOICE_TRAILING).strip(CHOICE_QUOTES + " "))
+
+
+def match_link_choice(choice, links, formatting=True):
+    """
+    Returns the offered link the model chose: an exact match, then the only link equal to the
+    choice case-insensitively, then (if formatting is True) the only one equal up to formatting
+    (see normalize_choice). Returns None if the choice matches none of the links, or several of them.
+    """
+    if choice in links:
+        return choice
+    for normalize in (casefold_title, normalize_choice) if formatting else (casefold_title,):
+        key = normalize(choice)
+        matches = [link for link in links if normalize(link) == key]
+        if matches:
+            return matches[0] if len(matches) == 1 else None
+    return None
+
+
+def run_link_episode(context, start, end, model, usage=None):
+    """
+    Plays a Link-Aware episode: at each step the model sees the real outgoing links
+    of the current page and chooses the next one. The episode stops early on the
+    policies in link_termination_policies. Returns the list of steps, the
+    distance-to-goal trace of every choice and the termination reason.
+    """
+    # Distances to the end node, shared by all the models playing this game
+    distances = get_distance_map(end)
+    trace = []
+    # Initialize the steps list with the start node
+    steps = [start]
+    new_step = start
+    while True:
+        if new_step.lower() == end.lower() and len(steps) > 1:
+            return steps, trace, "goal_reached"
+        if len(steps) >= max_steps_try:
+            return steps, trace, "max_steps"
+        links = link_prefetcher.visible_links(new_step, steps)
+        # Nothing to choose from: do not pay for a model call
+        if not links and "dead_end" in link_termination_policies:
+            return steps, trace, "dead_end"
+        # Create the request for the link context
+        request_link = f"Start_Node: {new_step} - End_Node: {end}\n\nList_Link_From_Start_Node:\n{format_link_list(links)}"
+        # Fetch the most likely next pages while the model is choosing
+        prefetched = link_prefetcher.prefetch(links, end, distances)
+        # Call the model to get the next step, matched to the offered link it refers to
+        answer = decode_link_choice(call_model(model, context, request_link, link=True, usage=usage), links)
+        # A revisit is recognized before matching up to formatting, which could turn it into another page
+        revisit = answer not in links and match_link_choice(answer, steps, formatting=False) is not None
+        matched = None if revisit else match_link_choice(answer, links)
+        new_step = matched if matched is not None else answer
+        link_prefetcher.settle(prefetched, new_step)
+        trace.append(trace_step(distances, steps[-1], links, new_step, answer))
+        steps.append(new_step)
+        if matched is None:
+            # Visited pages are not offered again, so a revisit does not match any link
+            if "cycle" in link_termination_policies and match_link_choice(answer, steps[:-1]) is not None:
+                return steps, trace, "cycle"
+            if "invalid_choice" in link_termination_policies:
+                return steps, trace, "invalid_choice"
+
+
+def job_request(job):
+    """
+    Returns the user request of a Blind context job.
+    """
+    return f"Start_Node: {job['game']['start_node']} - End_Node: {job['game']['end_node']}"
+
+
+def run_job(job):
+    """
+    Runs a single (game_mode, game, context_type, model) job and returns its result record.
+    """
+    context_type = job["context_type"]
+    model = job["model"]
+    context = context_type[1]
+    # Token usage of every model call of the job
+    usage = []
+    with metrics.measure(f"job_{context_type[0]}", model=model[1]):
+        # If the context type is not LINK, we use the normal context
+        if context_type[0] != "LINK":
+            steps = call_model(model, context, job_request(job), usage=usage)
+            return build_record(job, steps, usage)
+        # If the context type is LINK, the model plays the game step by step
+        steps, distance_trace, termination_reason = run_link_episode(context, job["game"]["start_node"], job["game"]["end_node"], model, usage)
+        return build_record(job, steps, usage, distance_trace, termination_reason)
+
+
+def check_steps(steps):
+    """
+    Returns the errors of the path and the number of missing links, missing pages and
+    disambiguation pages, or "NO CORRECT PATH" if the path cannot be checked.
+    """
+    # Try to check the errors in the steps
+    try:
+        # Check the errors in the steps
+        errors = validate_paths([steps])[0]
+        # Count the number of errors
+        num_no_link, num_no_page, num_dis_page = count_error_steps(errors)
+    # If there is an error, we set the errors to NO CORRECT PATH
+    except:
+        errors = ["NO CORRECT PATH"]
+        num_no_link=0
+        num_no_page=0
+        num_dis_page=0
+    return errors, num_no_link, num_no_page, num_dis_page
+
+
+def build_record(job, steps, usage, distance_trace=None, termination_reason=None):
+    """
+    Returns the result record of a job from the steps of the model path.
+    """
+    game = job["game"]
+    model = job["model"]
+    # Get the start and end nodes
+    start = game["start_node"]
+    end = game["end_node"]
+    # Get the average human step to win
+    avg_human_step_to_win = game["avg_human_step_to_win"]
+    # Initialize the human paths string
+    human_paths = ""
+    # Get the list of human paths with result
+    list_path_user_with_result = game["list_path_user_with_result"]
+    # Iterate over all human paths
+    for path_user in list_path_user_with_result:
+        # If the path is correct, we add it to the human paths string
+        if path_user[1] == True:
+            # Add the path to the human paths string with the @#@ separator for an human readable format
+            human_paths += path_user[0] +" @#@\n"
+    errors, num_no_link, num_no_page, num_dis_page = check_steps(steps)
+    if distance_trace is not None:
+        num_reducing_steps, num_optimal_choices = summarize_trace(distance_trace)
+    else:
+        num_reducing_steps = num_optimal_choices = None
+    # Check if the path is complete
+    complete_path = "True" if end in steps else "False"
+    return {
+        "game_mode": job["game_mode"],
+        "game_num": job["game_num"],
+        "model_name": model[0],
+        "version_model": model[1],
+        "type_context": job["context_type"][0],
+        "inference_mode": "UNSUPERVISED",
+        "start_node": start,
+        "end_node": end,
+        "steps": " ->\n".join(steps),
+        "errors": errors,
+        "num_no_link": num_no_link,
+        "num_no_page": num_no_page,
+        "num_dis_page": num_dis_page,
+        "complete_path": complete_path,
+        "termination_reason": termination_reason,
+        "distance_trace": distance_trace,
+        "num_reducing_steps": num_reducing_steps,
+        "num_optimal_choices": num_optimal_choices,
+        "num_model_calls": len(usage),
+        "prompt_tokens": sum_usage(usage, "prompt_tokens"),
+        "cached_tokens": sum_usage(usage, "cached_tokens"),
+        "completion_tokens": sum_usage(usage, "completion_tokens"),
+        "token_usage": usage,
+        "avg_human_step_to_win": avg_human_step_to_win,
+        "human_paths": human_paths
+    }
+
+
+def batch_custom_id(job):
+    """
+    Returns the custom_id of a job in the batch input file.
+    """
+    return "|".join(str(part) for part in job_key(job))
+
+
+def submit_batch_jobs(jobs, requests_path=batch_requests_path, state_path=batch_state_path):
+    """
+    Writes the requests of the jobs to the batch input file and submits them as one batch.
+    If the batch of a previous run is still pending it is resumed instead, so nothing is paid twice.
+    Returns the batch ID, or None if there is nothing to submit.
+    """
+    if os.path.exists(state_path):
+        with open(state_path, "r") as f:
+            batch_id = json.load(f)["batch_id"]
+        print(f"Resuming batch {batch_id} of a previous run")
+        return batch_id
+    if not jobs:
+        return None
+    write_batch_requests(requests_path, [
+        batch_request_line(batch_custom_id(job), job["model"][1], job["context_type"][1], job_request(job))
+        for job in jobs
+    ])
+    batch = submit_batch(requests_path)
+    with open(state_path, "w") as f:
+        json.dump({"batch_id": batch["id"]}, f)
+    print(f"Submitted batch {batch['id']} with {len(jobs)} requests")
+    return batch["id"]
+
+
+def collect_batch_jobs(batch_id, jobs):
+    """
+    Waits for the batch and parses every answer into the result record of its job.
+    Failed requests return no record, so they are submitted again by the next run.
+    """
+    batch = wait_for_batch(batch_id)
+    results = batch_results(batch)
+    jobs_by_id = {batch_custom_id(job): job for job in jobs}
+    answers = []
+    for custom_id, (text, reported_usage, error) in results.items():
+        # Jobs already stored (or not pending anymore) are skipped
+        if custom_id not in jobs_by_id:
+            continue
+        if error is not None:
+            print(f"Batch request {custom_id} failed: {error}")
+            continue
+        usage = []
+        record_usage(usage, reported_usage)
+        job = jobs_by_id[custom_id]
+        # Keep the answer for later replays, as for the synchronous calls
+        if response_cache.mode != "off":
+            backend = get_backend(job["model"])
+            key = response_key(backend.provider, backend.version, backend.seed, job["context_type"][1], job_request(job))
+            response_cache.put(key, backend.provider, backend.version, text, usage)
+        answers.append((job, parse_steps(text), usage))
+
+    # Check the edges of all the paths at once, so that every record finds them in the cache
+    try:
+        validate_paths([steps for _, steps, _ in answers])
+    except Exception as e:
+        # Every record still validates its own path, and may end up as NO CORRECT PATH
+        print(f"Validation of the paths of batch {batch_id} failed, checking them one by one: {e!r}")
+    records = [build_record(job, steps, usage) for job, steps, usage in answers]
+    print(f"Batch {batch_id} {batch['status']}: {len(records)} records, {len(jobs_by_id) - len(records)} jobs left for the next run")
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the LLM experiments of the paper dataset.")
+    parser.add_argument("--shard", type=parse_shard, default=None, metavar="i/N",
+                        help="run only the i-th of N disjoint shards of the jobs (0 <= i < N), with its own result store")
+    args = parser.parse_args()
+
+    f = open("./dataset/dataset_paper.json", "r")
+    dataset_game = json.load(f)
+    f.close()
+
+    jobs = build_jobs(dataset_game)
+
+    # Games are sharded with all their jobs, so the pages and distance map of a game are fetched
+    # on one worker only. Every shard writes its own store (and batch files), merged by export_results_wikigame.py
+    store_path, requests_path, state_path = results_store_path, batch_requests_path, batch_state_path
+    if args.shard is not None:
+        games = shard_keys([(job["game_mode"], job["game_num"]) for job in jobs], args.shard)
+        jobs = [job for job in jobs if (job["game_mode"], job["game_num"]) in games]
+        store_path, requests_path, state_path = (shard_path(path, args.shard) for path in (results_store_path, batch_requests_path, batch_state_path))
+        metrics.path = shard_path(metrics.path, args.shard)
+        print(f"Shard {args.shard[0]}/{args.shard[1]}: {len(jobs)} jobs")
+
+    # Skip the jobs already completed by a previous (interrupted) run, in any store: a shard
+    # that is run again, on this or another worker, does not pay for the jobs already done
+    store = ResultStore(store_path)
+    completed = {record_key(record) for record in merged_records(results_store_path)}
+    pending = [job for job in jobs if job_key(job) not in completed]
+    print(f"{len(jobs) - len(pending)} jobs already completed, {len(pending)} to run")
+
+    # Prompt and cached tokens of this run for each context type
+    token_totals = {}
+
+    def store_record(record):
+        store.append(record)
+        totals = token_totals.setdefault(record["type_context"], {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0})
+        totals["calls"] += record["num_model_calls"]
+        totals["prompt_tokens"] += record["prompt_tokens"] or 0
+        totals["cached_tokens"] += record["cached_tokens"] or 0
+
+    # With batch_mode the single-shot GPT jobs go to the Batch API, which runs while the other jobs are played.
+    # Answers already in the response cache are not paid again, and nothing is submitted when replaying.
+    batch_id = None
+    batch_jobs = []
+    if batch_mode and response_cache.mode != "replay":
+        batch_jobs = [
+            job for job in pending
+            if get_backend(job["model"]).provider == "GPT" and job["context_type"][0] in batch_contexts
+            and not response_cache.contains(get_backend(job["model"]), job["context_type"][1], job_request(job))
+        ]
+        batch_keys = {job_key(job) for job in batch_jobs}
+        pending = [job for job in pending if job_key(job) not in batch_keys]
+        batch_id = submit_batch_jobs(batch_jobs, requests_path, state_path)
+
+    # Run the independent jobs concurrently, storing every record as soon as it is ready
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {executor.submit(run_job, job): job for job in pending}
+    finished = set()
+
+    def store_job(future):
+        finished.add(future)
+        try:
+            store_record(future.result())
+        except Exception as e:
+            # The job is not stored, so it will be run again on the next run
+            print(f"Job {job_key(futures[future])} failed: {e!r}")
+
+    try:
+        for future in as_completed(futures):
+            store_job(future)
+    except BaseException:
+        # Interrupted (e.g. Ctrl-C): the queued jobs are cancelled, and the running ones are
+        # still stored when they finish, so that no model call already paid for is lost
+        executor.shutdown(wait=False, cancel_futures=True)
+        running = [future for future in futures if future not in finished and not future.cancelled()]
+        print(f"Interrupted: storing the {len(running)} running jobs, the others are left for the next run")
+        for future in as_completed(running):
+            store_job(future)
+        raise
+    executor.shutdown()
+
+    if batch_id is not None:
+        for record in collect_batch_jobs(batch_id, batch_jobs):
+            store_record(record)
+        # Only forget the batch once its records are stored
+        os.remove(state_path)
+
+    for type_context, totals in token_totals.items():
+        cached_share = totals["cached_tokens"] / totals["prompt_tokens"] * 100 if totals["prompt_tokens"] else 0
+        print(f"{type_context}: {totals['calls']} model calls, {totals['prompt_tokens']} prompt tokens, {totals['cached_tokens']} cached ({cached_share:.1f}%)")
 
-    # Create DataFrame and save in Excel
-    df = pd.DataFrame(results)
-    df.to_excel("./results/results_wikigame.xlsx", index=False)
+    if response_cache.mode != "off":
+        print(f"Response cache ({response_cache.mode}): {response_cache.hits} answers reused, {response_cache.misses} not stored")
+    print(f"Results stored in '{store_path}', run export_results_wikigame.py to create the Excel file")
 
+    if link_prefetcher.enabled:
+        print(f"Link prefetch: {link_prefetcher.submitted} pages prefetched, {link_prefetcher.used} steps found their page prefetched")
 
+    # Latency percentiles, requests, cache hits and tokens of each operation and model
+    metrics.print_summary()
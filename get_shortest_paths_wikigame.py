@@ -0,0 +1,115 @@
+import os
+import sys
+from multiprocessing import Pool
+
+from artifacts import SHORTEST_PATHS_PATH, SHORTEST_PATHS_SCHEMA, PATH_DISTANCES_PATH, PATH_DISTANCES_SCHEMA, ParquetTableWriter, read_statistics
+from resultstore import merged_records
+from settings import link_graph_path, cache_path, results_store_path, oracle_processes, oracle_cache_graph_path, oracle_min_cache_coverage
+from wikigraph import WikiGraph, load_link_graph
+
+# Link graph of each worker process, memory-mapped from the snapshot directory
+graph = None
+
+
+def init_worker(snapshot_dir):
+    global graph
+    graph = WikiGraph.load(snapshot_dir)
+
+
+def snapshot_directory(start_nodes):
+    """
+    Returns a snapshot directory the workers can memory-map: the offline link graph
+    when link_graph_path is set, otherwise a graph built from the links in the cache.
+    Exits when too few start nodes have links in the graph built from the cache.
+    """
+    if link_graph_path is not None and os.path.isdir(link_graph_path):
+        snapshot_dir = link_graph_path
+        source = WikiGraph.load(snapshot_dir)
+    elif link_graph_path is not None:
+        snapshot_dir = oracle_cache_graph_path
+        source = load_link_graph(link_graph_path)
+        source.save(snapshot_dir)
+    else:
+        snapshot_dir = oracle_cache_graph_path
+        source = WikiGraph.from_link_cache(cache_path)
+        coverage = source.coverage(start_nodes)
+        if coverage < oracle_min_cache_coverage:
+            sys.exit(
+                f"Only {coverage:.0%} of the start nodes have links in the cache '{cache_path}' "
+                f"(oracle_min_cache_coverage = {oracle_min_cache_coverage}). Validate the human paths first "
+                f"(get_human_validation_wikigame.py) or set link_graph_path to a snapshot of the link graph."
+            )
+        source.save(snapshot_dir)
+    # Build the navigation adjacency once, the workers memory-map it
+    if source._navigation is None:
+        source.save_navigation(snapshot_dir)
+    return snapshot_dir
+
+
+def shortest_path_row(pair):
+    """
+    Returns the oracle row of a (from_node, to_node) pair.
+    """
+    from_node, to_node = pair
+    hops, count = graph.shortest_path_stats(from_node, to_node)
+    return {
+        "from_node": from_node,
+        "to_node": to_node,
+        "shortest_hops": hops,
+        "num_shortest_paths": count if hops is not None else None
+    }
+
+
+def path_distance_rows(task):
+    """
+    Computes the distances to the goal once for an end node and returns the rows
+    of all the stored records that have that end node.
+    """
+    end, records = task
+    distances = graph.distances_to(end)
+    rows = []
+    for record in records:
+        steps = record["steps"].split(" ->\n")
+        hops, _ = graph.shortest_path_stats(record["start_node"], end)
+        if distances is None:
+            distance_to_goal = [None] * len(steps)
+        else:
+            distance_to_goal = [graph.distance_to(distances, step) for step in steps]
+        # Extra hops over the shortest path, only for paths that reach the goal
+        optimality_gap = steps.index(end) - hops if end in steps and hops is not None else None
+        rows.append({
+            "game_mode": record["game_mode"],
+            "game_num": record["game_num"],
+            "model_name": record["model_name"],
+            "version_model": record["version_model"],
+            "type_context": record["type_context"],
+            "shortest_hops": hops,
+            "distance_to_goal": distance_to_goal,
+            "optimality_gap": optimality_gap
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    # Every start--goal pair of the human log
+    df_stats = read_statistics()
+    pairs = list(dict.fromkeys(zip(df_stats["from_node"].tolist(), df_stats["to_node"].tolist())))
+
+    snapshot_dir = snapshot_directory([from_node for from_node, _ in pairs])
+
+    # Stored model records (of every shard) grouped by end node, so each reverse search is done once
+    records_by_end = {}
+    for record in merged_records(results_store_path):
+        records_by_end.setdefault(record["end_node"], []).append(record)
+
+    with Pool(processes=oracle_processes, initializer=init_worker, initargs=(snapshot_dir,)) as pool:
+        with ParquetTableWriter(SHORTEST_PATHS_PATH, SHORTEST_PATHS_SCHEMA) as writer:
+            for row in pool.imap(shortest_path_row, pairs, chunksize=64):
+                writer.write(row)
+        print(f"Shortest paths of {len(pairs)} pairs saved in '{SHORTEST_PATHS_PATH}'")
+
+        with ParquetTableWriter(PATH_DISTANCES_PATH, PATH_DISTANCES_SCHEMA) as writer:
+            for rows in pool.imap(path_distance_rows, records_by_end.items()):
+                for row in rows:
+                    writer.write(row)
+        print(f"Distances to the goal of {sum(len(records) for records in records_by_end.values())} model paths saved in '{PATH_DISTANCES_PATH}'")
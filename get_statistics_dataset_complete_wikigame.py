@@ -1,58 +1,76 @@
-import json
 import pandas as pd
+from jsonstream import iter_json_list_items
+from artifacts import MATCHES_SCHEMA, STATISTICS_SCHEMA, MATCHES_PATH, STATISTICS_PATH, ParquetTableWriter, read_matches, read_statistics
+from settings import statistics_excel
 
-f = open("./dataset/dataset_wiki_game_complete.json", "r")
-data = json.load(f)
+# Running aggregates for each combination, in order of first appearance
+all_stats = {}
 
-# Lists to collect global data
-all_matches = []
-all_stats = []
-
-# Analyze each key
-for key, matches in data.items():
-    if key.startswith("FROM_") and "_TO_" in key:
+# Stream the matches one at a time: only the aggregates of each combination are kept in memory
+with ParquetTableWriter(MATCHES_PATH, MATCHES_SCHEMA) as matches_writer:
+    for key, match in iter_json_list_items("./dataset/dataset_wiki_game_complete.json"):
+        if not (key.startswith("FROM_") and "_TO_" in key):
+            continue
         start_node = key.split("_TO_")[0].replace("FROM_", "")
         end_node = key.split("_TO_")[1]
+        path_length = len(match["path_concept"])
 
-        for match in matches:
-            all_matches.append({
-                "from_node": start_node,
-                "to_node": end_node,
-                "player_name": match["player_name"],
-                "path_length": len(match["path_concept"]),
-                "path": " -> ".join(match["path_concept"]),
-                "won": match["won"],
-                "time": match["time"],
-                "points": match["points"]
-            })
-
-        # Statistics for this combination
-        df_temp = pd.DataFrame(matches)
-        df_temp["path_length"] = df_temp["path_concept"].apply(lambda x: len(x))
-
-        total_games = len(df_temp)
-        won_games = df_temp["won"].sum()
-        win_percentage = (won_games / total_games) * 100 if total_games > 0 else 0
-        avg_steps_to_win = df_temp[df_temp["won"] == True]["path_length"].mean()
-        avg_time_to_win = df_temp[df_temp["won"] == True]["time"].mean()
+        matches_writer.write({
+            "from_node": start_node,
+            "to_node": end_node,
+            "player_name": match["player_name"],
+            "path_length": path_length,
+            "path": " -> ".join(match["path_concept"]),
+            "won": match["won"],
+            "time": match["time"],
+            "points": match["points"]
+        })
 
-        all_stats.append({
+        stats = all_stats.setdefault(key, {
             "from_node": start_node,
             "to_node": end_node,
+            "total_games": 0,
+            "won_games": 0,
+            "won_steps": 0,
+            "won_time": 0,
+            "won_timed_games": 0
+        })
+        stats["total_games"] += 1
+        if match["won"] == True:
+            stats["won_games"] += 1
+            stats["won_steps"] += path_length
+            if match["time"] is not None:
+                stats["won_time"] += match["time"]
+                stats["won_timed_games"] += 1
+
+# Statistics for each combination
+with ParquetTableWriter(STATISTICS_PATH, STATISTICS_SCHEMA) as stats_writer:
+    for stats in all_stats.values():
+        total_games = stats["total_games"]
+        won_games = stats["won_games"]
+        win_percentage = (won_games / total_games) * 100 if total_games > 0 else 0
+        avg_steps_to_win = stats["won_steps"] / won_games if won_games > 0 else None
+        avg_time_to_win = stats["won_time"] / stats["won_timed_games"] if stats["won_timed_games"] > 0 else None
+
+        stats_writer.write({
+            "from_node": stats["from_node"],
+            "to_node": stats["to_node"],
             "total_games": total_games,
             "won_games": won_games,
             "win_percentage": round(win_percentage, 2),
-            "avg_steps_to_win": round(avg_steps_to_win, 2) if pd.notna(avg_steps_to_win) else "N/A",
-            "avg_time_to_win": round(avg_time_to_win, 2) if pd.notna(avg_time_to_win) else "N/A"
+            "avg_steps_to_win": round(avg_steps_to_win, 2) if avg_steps_to_win is not None else None,
+            "avg_time_to_win": round(avg_time_to_win, 2) if avg_time_to_win is not None else None
         })
 
-# Final DataFrames
-df_matches = pd.DataFrame(all_matches)
-df_stats = pd.DataFrame(all_stats)
+print("Parquet generated: 'wikigame_matches.parquet', 'wikigame_statistics.parquet'")
+
+# Optional human-readable copy in Excel
+if statistics_excel:
+    df_matches = read_matches()
+    df_stats = read_statistics()
 
-# Write to Excel
-with pd.ExcelWriter("./statistics/wikigame_statistics.xlsx", engine="openpyxl") as writer:
-    df_matches.to_excel(writer, sheet_name="All Matches", index=False)
-    df_stats.to_excel(writer, sheet_name="Statistics", index=False)
+    with pd.ExcelWriter("./statistics/wikigame_statistics.xlsx", engine="openpyxl") as writer:
+        df_matches.to_excel(writer, sheet_name="All Matches", index=False)
+        df_stats.to_excel(writer, sheet_name="Statistics", index=False)
 
-print("Excel generated: 'wikigame_statistics.xlsx'")
\ No newline at end of file
+    print("Excel generated: 'wikigame_statistics.xlsx'")
@@ -0,0 +1,131 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+from ratelimit import TokenBucket
+from settings import http_max_retries, http_backoff_base, http_backoff_max, http_pool_size, http_timeout, http_user_agent, host_requests_per_minute
+
+
+# Status codes worth retrying: rate limited, or a temporary server failure
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class HttpError(Exception):
+    """
+    Raised when a request still fails after all the retries.
+    """
+
+
+def response_size(response, stream):
+    """
+    Returns the size of the response body, from Content-Length for streamed responses
+    (which are not read here).
+    """
+    if stream:
+        return int(response.headers.get("Content-Length") or 0)
+    return len(response.content)
+
+
+def parse_retry_after(value):
+    """
+    Returns the seconds to wait from a Retry-After header (seconds or HTTP date), or None.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpClient:
+    """
+    Shared HTTP client for every outbound call: one session with keep-alive connection
+    pools, a token bucket per host, and bounded retries with exponential backoff and
+    jitter that honor Retry-After on 429 and 5xx responses.
+    """
+
+    def __init__(self, max_retries=5, backoff_base=1.0, backoff_max=60.0, pool_size=32, timeout=60, user_agent=None, requests_per_minute=None):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.requests_per_minute = requests_per_minute or {}
+        self.buckets = {}
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if user_agent:
+            self.session.headers["User-Agent"] = user_agent
+
+    def bucket(self, host):
+        """
+        Returns the token bucket of the given host.
+        """
+        if host not in self.buckets:
+            self.buckets.setdefault(host, TokenBucket(self.requests_per_minute.get(host)))
+        return self.buckets[host]
+
+    def request(self, method, url, max_retries=None, **kwargs):
+        """
+        Sends a request, retrying connection errors, timeouts, 429 and 5xx responses up to
+        max_retries times (the retries of the client by default).
+        Returns the response (which may still be a 4xx), or raises HttpError after the last retry.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlparse(url).netloc
+        bucket = self.bucket(host)
+        with metrics.measure("http_request", host=host):
+            return self._send(bucket, method, url, self.max_retries if max_retries is None else max_retries, **kwargs)
+
+    def _send(self, bucket, method, url, max_retries, **kwargs):
+        for attempt in range(max_retries + 1):
+            bucket.acquire()
+            retry_after = None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.add(http_calls=1)
+                error = repr(e)
+            else:
+                metrics.add(http_calls=1, bytes=response_size(response, kwargs.get("stream", False)))
+                if response.status_code not in RETRY_STATUS_CODES:
+                    return response
+                error = f"HTTP {response.status_code}"
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+
+            if attempt == max_retries:
+                raise HttpError(f"{method} {url} failed after {attempt + 1} attempts: {error}")
+            delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+                # Hold back every other request to the same host as well
+                bucket.pause(delay)
+            time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+
+http_client = HttpClient(
+    max_retries=http_max_retries,
+    backoff_base=http_backoff_base,
+    backoff_max=http_backoff_max,
+    pool_size=http_pool_size,
+    timeout=http_timeout,
+    user_agent=http_user_agent,
+    requests_per_minute=host_requests_per_minute,
+)
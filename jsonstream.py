@@ -0,0 +1,101 @@
+import json
+
+
+class JsonStreamReader:
+    """
+    Incremental reader for JSON files shaped like {key: [object, object, ...], ...}.
+    The file is read in chunks and each object of the lists is decoded on its own,
+    so memory does not grow with the size of the file. Values that are not lists are skipped.
+    """
+
+    def __init__(self, f, chunk_size=1 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """
+        Reads the next chunk, dropping the part of the buffer already consumed.
+        Returns False at the end of the file.
+        """
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        """
+        Skips whitespace and returns the next character, or "" at the end of the file.
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\n\r":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, chars):
+        char = self._peek()
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at offset {self.pos}, found {char!r}")
+        self.pos += 1
+        return char
+
+    def _decode(self):
+        """
+        Decodes the next JSON value, reading more chunks while it is incomplete.
+        """
+        # A number or literal is complete only once a delimiter follows it
+        if self._peek() not in "\"{[":
+            while not any(char in self.buf[self.pos:] for char in ",]} \t\n\r") and self._fill():
+                pass
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            self.pos = end
+            return value
+
+    def items(self):
+        """
+        Yields (key, object) for every object of every list, in file order.
+        """
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            key = self._decode()
+            self._expect(":")
+            if self._peek() == "[":
+                self.pos += 1
+                if self._peek() == "]":
+                    self.pos += 1
+                else:
+                    while True:
+                        yield key, self._decode()
+                        if self._expect(",]") == "]":
+                            break
+            else:
+                self._decode()
+            if self._expect(",}") == "}":
+                return
+
+
+def iter_json_list_items(path):
+    """
+    Yields (key, object) for every object in the lists of a {key: [objects]} JSON file.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        yield from JsonStreamReader(f).items()
@@ -0,0 +1,144 @@
+import difflib
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from distancetracking import distance_to_goal
+from metrics import metrics
+from settings import link_prefetch_budget, link_prefetch_workers
+from wikigametools import get_all_visible_existing_internal_links, get_visible_link_set, link_graph
+
+
+def rank_candidates(links, end, budget, distances=None):
+    """
+    Returns the budget links most likely to be the next page, most likely first: closest to
+    the goal on the distance map (when known), then most similar title to the goal.
+    The exact similarity is computed only for the links whose SequenceMatcher.quick_ratio, an
+    upper bound of it, could still beat the budget-th best link found so far, and nothing is
+    sorted beyond the budget.
+    """
+    if budget <= 0:
+        return []
+    matcher = difflib.SequenceMatcher(None, "", end.lower())
+    estimates = []
+    for i, link in enumerate(links):
+        distance = distance_to_goal(distances, link)
+        matcher.set_seq1(link.lower())
+        estimates.append((distance is None, distance or 0, -matcher.quick_ratio(), i, link))
+    heapq.heapify(estimates)
+
+    # Max-heap of the budget most likely links found so far, keyed by their negated likelihood
+    best = []
+    while estimates:
+        unknown, distance, bound, i, link = heapq.heappop(estimates)
+        if len(best) == budget and (unknown, distance, bound) > tuple(-x for x in best[0][0][:3]):
+            break
+        matcher.set_seq1(link.lower())
+        key = (unknown, distance, -matcher.ratio(), i)
+        entry = (tuple(-x for x in key), link)
+        if len(best) < budget:
+            heapq.heappush(best, entry)
+        elif entry[0] > best[0][0]:
+            heapq.heapreplace(best, entry)
+    return [link for _, link in sorted(best, reverse=True)]
+
+
+class LinkPrefetcher:
+    """
+    Fetches the visible links of the likely next pages of Link-Aware episodes in the background,
+    while the model call is in flight, so that the next step finds them in the visible links memo.
+    At most budget pages are prefetched per step; a page already being fetched is not requested
+    again, by the same or another episode, and the prefetches of a step that have not started
+    when the model has chosen are cancelled.
+    """
+
+    def __init__(self, budget, workers):
+        self.budget = budget
+        # With an offline link graph there is nothing to hide behind the model call
+        self.enabled = budget > 0 and workers > 0 and link_graph is None
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch") if self.enabled else None
+        self.in_flight = {}
+        self.fetched = set()
+        self.submitted = 0
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def _fetch(self, title):
+        with metrics.measure("prefetch_visible_links"):
+            return get_visible_link_set(title)
+
+    def _done(self, title, future):
+        with self.lock:
+            if self.in_flight.get(title) is future:
+                del self.in_flight[title]
+            if not future.cancelled() and future.exception() is None:
+                self.fetched.add(title)
+
+    def prefetch(self, links, end, distances=None):
+        """
+        Ranks links and starts fetching the most likely next pages, all in the background so
+        that the model call is not delayed. Returns the step, to be passed to settle once the
+        model has chosen.
+        """
+        if not self.enabled:
+            return None
+        step = {"started": [], "settled": False}
+        self.executor.submit(self._start, step, links, end, distances)
+        return step
+
+    def _start(self, step, links, end, distances):
+        if step["settled"]:
+            return
+        with metrics.measure("prefetch_rank"):
+            candidates = rank_candidates(links, end, self.budget, distances)
+        for title in candidates:
+            with self.lock:
+                # The model has already chosen
+                if step["settled"]:
+                    return
+                if title in self.in_flight or title in self.fetched:
+                    continue
+                future = self.executor.submit(self._fetch, title)
+                self.in_flight[title] = future
+                self.submitted += 1
+                step["started"].append(title)
+            future.add_done_callback(lambda future, title=title: self._done(title, future))
+
+    def settle(self, step, choice):
+        """
+        Stops the prefetches of the step: those still queued are cancelled, except the chosen page.
+        """
+        if step is None:
+            return
+        with self.lock:
+            step["settled"] = True
+            started = list(step["started"])
+        for title in started:
+            if title == choice:
+                continue
+            with self.lock:
+                future = self.in_flight.get(title)
+            if future is not None:
+                future.cancel()
+
+    def visible_links(self, title, steps):
+        """
+        Returns get_all_visible_existing_internal_links(title, steps), waiting for the prefetch
+        of the page if it is in flight instead of fetching it again.
+        """
+        with self.lock:
+            future = self.in_flight.get(title)
+            prefetched = future is not None or title in self.fetched
+        if future is not None:
+            try:
+                future.result()
+            except Exception:
+                # Cancelled or failed: fetched again below
+                prefetched = False
+        if prefetched:
+            with self.lock:
+                self.used += 1
+        return get_all_visible_existing_internal_links(title, steps)
+
+
+link_prefetcher = LinkPrefetcher(link_prefetch_budget, link_prefetch_workers)
@@ -0,0 +1,140 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class BatchNotSupported(Exception):
+    """
+    Raised by a send_batch function when the endpoint does not accept batched requests.
+    """
+
+
+class MicroBatcher:
+    """
+    Collects the prompts submitted by concurrent threads for up to window seconds (or until
+    max_size prompts are waiting) and sends them with one send_batch(items) call, which returns
+    the answers in the same order (an Exception instead of an answer for a failed item).
+    At most max_in_flight requests are sent at once; prompts arriving meanwhile wait for the
+    next batch, so batches grow when the endpoint is busy.
+
+    Failed items are sent again on their own with send_single(item). If send_batch raises
+    BatchNotSupported, or two batches in a row fail as a whole while their prompts succeed one
+    by one, the endpoint is taken as not supporting batches and every later prompt is sent on its own.
+    """
+
+    def __init__(self, send_batch, send_single, max_size=16, window=0.05, max_in_flight=2):
+        self.send_batch = send_batch
+        self.send_single = send_single
+        self.max_size = max_size
+        self.window = window
+        self.batching = max_size > 1
+        self.batches = 0
+        self.batched_items = 0
+        self.single_requests = 0
+        self._failed_batches = 0
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="microbatch")
+        self._queue = queue.Queue()
+        self._collector = None
+        self._lock = threading.Lock()
+
+    def call(self, item):
+        """
+        Returns the answer to item, sent in a batch with the other prompts waiting, or on
+        its own if the endpoint does not support batches.
+        """
+        return self.call_many([item])[0]
+
+    def call_many(self, items):
+        """
+        Returns the answers to items, queued together so that they share the same batches.
+        """
+        if not self.batching:
+            answers = []
+            for item in items:
+                with self._slots:
+                    answers.append(self._single(item))
+            return answers
+        futures = [Future() for _ in items]
+        with self._lock:
+            if self._collector is None:
+                self._collector = threading.Thread(target=self._collect, daemon=True, name="microbatch-collector")
+                self._collector.start()
+        for item, future in zip(items, futures):
+            self._queue.put((item, future))
+        return [future.result() for future in futures]
+
+    def _single(self, item):
+        with self._lock:
+            self.single_requests += 1
+        return self.send_single(item)
+
+    def _collect(self):
+        while True:
+            entries = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(entries) < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entries.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # Wait for a free request slot, while the next prompts keep queuing
+            self._slots.acquire()
+            self._executor.submit(self._dispatch, entries)
+
+    def _dispatch(self, entries):
+        try:
+            if self.batching and len(entries) > 1:
+                answers = self._send_batch(entries)
+            else:
+                answers = [None] * len(entries)
+            failed = []
+            for (item, future), answer in zip(entries, answers):
+                if answer is None or isinstance(answer, Exception):
+                    failed.append((item, future))
+                else:
+                    future.set_result(answer)
+            single_ok = 0
+            for item, future in failed:
+                try:
+                    future.set_result(self._single(item))
+                    single_ok += 1
+                except Exception as e:
+                    future.set_exception(e)
+            # The whole batch failed but its prompts work one by one: batches may not be supported
+            if self.batching and len(entries) > 1 and all(answer is None for answer in answers) and single_ok == len(entries):
+                with self._lock:
+                    self._failed_batches += 1
+                    failed_batches = self._failed_batches
+                if failed_batches >= 2:
+                    self._disable_batching("batched requests fail, single requests work")
+        finally:
+            self._slots.release()
+
+    def _send_batch(self, entries):
+        """
+        Returns the answers of a batch, or None for each item if the whole batch failed.
+        """
+        try:
+            answers = self.send_batch([item for item, _ in entries])
+        except BatchNotSupported as e:
+            self._disable_batching(str(e))
+            return [None] * len(entries)
+        except Exception as e:
+            print(f"Batch of {len(entries)} prompts failed, sending them one by one: {e!r}")
+            return [None] * len(entries)
+        with self._lock:
+            self.batches += 1
+            self.batched_items += len(entries)
+            self._failed_batches = 0
+        return answers
+
+    def _disable_batching(self, reason):
+        with self._lock:
+            if self.batching:
+                print(f"Endpoint does not support batched requests ({reason}), sending single requests")
+            self.batching = False
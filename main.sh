@@ -6,15 +6,27 @@ test -d statistics || mkdir statistics
 test -d results || mkdir results
 
 # Step 1: Generate human statistics
-echo "[1/3] Generating human statistics..."
+echo "[1/6] Generating human statistics..."
 python3 get_statistics_dataset_complete_wikigame.py
 
-# Step 2: Create the paper dataset
-echo "[2/3] Creating paper dataset..."
+# Step 2: Validate the human paths (and save the link graph of the cache, for the distances to the goal of step 4)
+echo "[2/6] Validating human paths..."
+python3 get_human_validation_wikigame.py
+
+# Step 3: Create the paper dataset
+echo "[3/6] Creating paper dataset..."
 python3 create_dataset_paper_wikigame.py
 
-# Step 3: Run LLM experiments
-echo "[3/3] Running LLM experiments..."
+# Step 4: Run LLM experiments
+echo "[4/6] Running LLM experiments..."
 python3 get_result_paper_wikigame.py
 
+# Step 5: Compute the shortest-path baselines
+echo "[5/6] Computing shortest-path baselines..."
+python3 get_shortest_paths_wikigame.py
+
+# Step 6: Export the stored results
+echo "[6/6] Exporting results..."
+python3 export_results_wikigame.py
+
 echo "Pipeline completed. Output in ./results/results_wikigame.xlsx"
@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from settings import metrics_enabled, metrics_path
+
+
+# Counters summed in the report, added to the operations in progress with Metrics.add
+COUNTERS = ["http_calls", "bytes", "cache_hits", "cache_misses", "response_cache_hits", "prompt_tokens", "completion_tokens"]
+
+
+def percentile(sorted_values, q):
+    """
+    Returns the q-th percentile (nearest rank) of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+class Metrics:
+    """
+    Low-overhead instrumentation of the hot paths. Every measured operation becomes one
+    JSON line in the metrics file (operation, model, wall time and counters), and the
+    durations are kept in memory for the p50/p95/p99 report at the end of the run.
+    Counters such as HTTP calls, bytes, cache hits and tokens are added to every operation
+    in progress in the current thread, so a model call or a lookup also accounts for
+    the requests it made.
+    """
+
+    def __init__(self, path, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self.durations = {}
+        self.totals = {}
+        self._file = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def measure(self, operation, model=None, **fields):
+        """
+        Measures the wall time of the block. Yields the event, to which fields can be added.
+        """
+        if not self.enabled:
+            yield {}
+            return
+        event = {"operation": operation, "model": model, **fields}
+        stack = self._stack()
+        stack.append(event)
+        start = time.perf_counter()
+        try:
+            yield event
+        finally:
+            event["seconds"] = time.perf_counter() - start
+            stack.pop()
+            self.record(event)
+
+    def timed(self, operation):
+        """
+        Decorator that measures every call of the function as the given operation.
+        """
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.measure(operation):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def add(self, **counters):
+        """
+        Adds the counters to every operation in progress in the current thread.
+        """
+        if not self.enabled:
+            return
+        for event in self._stack():
+            for name, value in counters.items():
+                event[name] = event.get(name, 0) + value
+
+    def record(self, event):
+        event["time"] = time.time()
+        event["pid"] = os.getpid()
+        key = (event["operation"], event["model"])
+        line = json.dumps(event) + "\n"
+        with self._lock:
+            self.durations.setdefault(key, []).append(event["seconds"])
+            totals = self.totals.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            for name in COUNTERS:
+                totals[name] += event.get(name, 0)
+            # Forked worker processes open the file again instead of sharing the buffer
+            if self._file is None or self._pid != os.getpid():
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+                self._pid = os.getpid()
+            self._file.write(line)
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None and self._pid == os.getpid():
+                self._file.flush()
+
+    def summary(self):
+        """
+        Returns one row per (operation, model) with the count, total and percentile
+        times in milliseconds and the summed counters, slowest operations first.
+        """
+        rows = []
+        with self._lock:
+            for (operation, model), durations in self.durations.items():
+                durations = sorted(durations)
+                rows.append({
+                    "operation": operation,
+                    "model": model,
+                    "count": len(durations),
+                    "total_s": sum(durations),
+                    "p50_ms": percentile(durations, 50) * 1000,
+                    "p95_ms": percentile(durations, 95) * 1000,
+                    "p99_ms": percentile(durations, 99) * 1000,
+                    **self.totals[(operation, model)]
+                })
+        rows.sort(key=lambda row: row["total_s"], reverse=True)
+        return rows
+
+    def print_summary(self):
+        """
+        Prints the summary table and flushes the metrics file.
+        """
+        self.flush()
+        rows = self.summary()
+        if not rows:
+            return
+        print(f"\n{'operation':<40} {'model':<26} {'count':>7} {'total s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'http':>7} {'MB':>8} {'cache hit':>9} {'tokens':>10}")
+        for row in rows:
+            print(
+                f"{row['operation']:<40} {str(row['model'] or '-'):<26} {row['count']:>7} {row['total_s']:>9.1f} "
+                f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['http_calls']:>7} "
+                f"{row['bytes'] / 1e6:>8.2f} {row['cache_hits'] + row['response_cache_hits']:>9} {row['prompt_tokens'] + row['completion_tokens']:>10}"
+            )
+        print(f"Metrics of every operation saved in '{self.path}'")
+
+
+metrics = Metrics(metrics_path, enabled=metrics_enabled)
@@ -1,3 +1,4 @@
+# [provider, version] of each model: the provider selects its backend in backends.BACKENDS (GPT, LLAMA or STUB)
 list_model = [
     ["GPT", "gpt-4o-mini-2024-07-18"], 
     ["GPT", "gpt-4.1-nano-2025-04-14"], 
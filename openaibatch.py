@@ -0,0 +1,125 @@
+import json
+import os
+import time
+
+from api_key import GPT_API_KEY
+from backends import OpenAIBackend
+from httpclient import http_client, HttpError
+from settings import openai_api_base, batch_poll_interval, batch_completion_window
+
+
+# Endpoint every request of the batch is sent to
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# Statuses after which a batch does not change anymore
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def batch_request_line(custom_id, model, context, request):
+    """
+    Returns the line of the batch input file for a chat completion request,
+    with the same body sent by the OpenAI backend.
+    """
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": OpenAIBackend(model).request_body(context, request)
+    }
+
+
+def write_batch_requests(path, lines):
+    """
+    Writes the batch input file, one JSON request per line.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(json.dumps(line) + "\n")
+
+
+def check_response(response, action):
+    """
+    Returns the JSON body of an OpenAI response, or raises HttpError if the request failed.
+    """
+    if not response.ok:
+        raise HttpError(f"OpenAI {action} failed: HTTP {response.status_code} {response.text[:500]}")
+    return response.json()
+
+
+def submit_batch(path):
+    """
+    Uploads the batch input file and creates the batch. Returns the batch object.
+    """
+    headers = {"Authorization": GPT_API_KEY}
+    with open(path, "rb") as f:
+        content = f.read()
+    uploaded = check_response(http_client.post(
+        f"{openai_api_base}/files",
+        headers=headers,
+        data={"purpose": "batch"},
+        files={"file": (os.path.basename(path), content, "application/jsonl")}
+    ), "file upload")
+    return check_response(http_client.post(
+        f"{openai_api_base}/batches",
+        headers=headers,
+        json={
+            "input_file_id": uploaded["id"],
+            "endpoint": BATCH_ENDPOINT,
+            "completion_window": batch_completion_window
+        }
+    ), "batch creation")
+
+
+def get_batch(batch_id):
+    """
+    Returns the current batch object.
+    """
+    return check_response(http_client.get(f"{openai_api_base}/batches/{batch_id}", headers={"Authorization": GPT_API_KEY}), "batch status")
+
+
+def wait_for_batch(batch_id, poll_interval=batch_poll_interval):
+    """
+    Polls the batch until it reaches a final status and returns it.
+    """
+    while True:
+        batch = get_batch(batch_id)
+        if batch["status"] in FINAL_STATUSES:
+            return batch
+        counts = batch.get("request_counts") or {}
+        print(f"Batch {batch_id}: {batch['status']} ({counts.get('completed', 0)}/{counts.get('total', '?')} requests)")
+        time.sleep(poll_interval)
+
+
+def download_file(file_id):
+    """
+    Returns the content of a file produced by the batch.
+    """
+    response = http_client.get(f"{openai_api_base}/files/{file_id}/content", headers={"Authorization": GPT_API_KEY})
+    if not response.ok:
+        raise HttpError(f"OpenAI file download failed: HTTP {response.status_code}")
+    return response.text
+
+
+def batch_results(batch):
+    """
+    Returns a dict mapping the custom_id of every request of a finished batch to
+    (answer text, usage, error): text and usage are None when the request failed.
+    """
+    results = {}
+    for file_id in [batch.get("output_file_id"), batch.get("error_file_id")]:
+        if not file_id:
+            continue
+        for line in download_file(file_id).splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            response = item.get("response") or {}
+            body = response.get("body") or {}
+            if response.get("status_code") == 200 and body.get("choices"):
+                results[item["custom_id"]] = (body["choices"][0]["message"]["content"], body.get("usage"), None)
+            else:
+                results[item["custom_id"]] = (None, None, item.get("error") or body.get("error") or f"HTTP {response.get('status_code')}")
+    return results
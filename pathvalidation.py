@@ -0,0 +1,94 @@
+from wikigametools import get_internal_links_from_article, get_internal_links_batch, check_links_batch
+from metrics import metrics
+from settings import validation_mode
+
+
+def pairwise(iterable):
+    """
+    Yields consecutive pairs from the given iterable.
+    Example: pairwise('ABCDEFG') → AB, BC, CD, DE, EF, FG
+    """
+    iterator = iter(iterable)
+    a = next(iterator, None)
+
+    for b in iterator:
+        yield a, b
+        a = b
+
+@metrics.timed("check_error_steps")
+def check_error_steps(list_steps):
+    """
+    Checks the validity of each step in the provided list of steps.
+    Returns a list of errors found in the path (e.g., missing links or pages).
+    """
+    list_steps_after = []
+    list_error = []
+    for prev, next in pairwise(list_steps):
+        step=prev
+        list_link_page = get_internal_links_from_article(prev)
+        if list_link_page == False:
+            continue
+        else:
+            if list_link_page == []:
+                list_error.append(f"NO PAGE: {prev}")
+            else:
+                if next in list_link_page:
+                    continue
+                else:
+                    list_error.append(f"NO LINK: {prev} -> {next}")
+        list_steps_after.append(step)
+    return list_error
+
+
+def count_error_steps(error_steps):
+    """
+    Counts the number of different types of errors in the error_steps list.
+    Returns the counts for missing links, missing pages, and disambiguation pages.
+    """
+    num_no_link = 0
+    num_no_page = 0
+    num_dis_page = 0
+    for error in error_steps:
+        if "NO LINK:" in error:
+            num_no_link += 1
+        elif "NO PAGE:" in error:
+            num_no_page += 1
+        else:
+            num_dis_page += 1
+    return num_no_link, num_no_page, num_dis_page
+
+
+@metrics.timed("validate_paths")
+def validate_paths(paths):
+    """
+    Checks the validity of many paths at once, with the same error format as check_error_steps.
+    The source pages of all edges are de-duplicated and their links are fetched with
+    multi-title queries. Returns the list of errors of each path.
+    With validation_mode "pltitles" only the edges of the paths are checked, not every link.
+    """
+    if validation_mode == "pltitles":
+        statuses = check_links_batch((prev, next) for path in paths for prev, next in pairwise(path))
+        all_errors = []
+        for path in paths:
+            list_error = []
+            for prev, next in pairwise(path):
+                if statuses[(prev, next)] == "NO PAGE":
+                    list_error.append(f"NO PAGE: {prev}")
+                elif statuses[(prev, next)] == "NO LINK":
+                    list_error.append(f"NO LINK: {prev} -> {next}")
+            all_errors.append(list_error)
+        return all_errors
+
+    links = get_internal_links_batch(prev for path in paths for prev, _ in pairwise(path))
+    link_sets = {title: set(list_link_page) for title, list_link_page in links.items()}
+
+    all_errors = []
+    for path in paths:
+        list_error = []
+        for prev, next in pairwise(path):
+            if not link_sets[prev]:
+                list_error.append(f"NO PAGE: {prev}")
+            elif next not in link_sets[prev]:
+                list_error.append(f"NO LINK: {prev} -> {next}")
+        all_errors.append(list_error)
+    return all_errors
@@ -1,3 +1,11 @@
+import ast
+
+# Encoding of the offered links in Link-Aware requests:
+# "repr" (Python list, as in the paper), "lines" (one title per line) or "numbered" (one "N. title" per line,
+# the model may answer with the number). The system prompts are constants, so they stay byte-identical
+# across requests and the provider can reuse its cached prefix.
+link_list_format = "repr"
+
 context_no_think = """
 The WikiGame (also known as Wikirace, Wikispeedia, WikiGolf, or Wikipedia Speedrun) is a game where players must navigate from one Wikipedia page to another by clicking only internal links within the article body. The goal is to reach the target page using the fewest number of clicks or in the shortest time possible.
 
@@ -105,8 +113,75 @@ Very Important Instruction:
 
 
 
+context_link_numbered = """
+The WikiGame (also known as Wikirace, Wikispeedia, WikiGolf, or Wikipedia Speedrun) is a game where players must navigate from one Wikipedia page to another by clicking only internal links within the article body. The goal is to reach the target page using the fewest number of clicks or in the shortest time possible.
+
+How to play:
+A start page and an end page on Wikipedia are selected. These can be chosen randomly or decided by the players.
+Starting from the Start_Node, you must click only on internal links found within the main body of the article to reach the End_Node.
+
+Your task:
+The user will provide a Start_Node and an End_Node and a List_Link_From_Start_Node, a numbered list of page name linked from Start_Node, one per line.
+You must make a unique choice with a page from those proposed in List_Link_From_Start_Node, the page you choose must get you as close as possible from Start_Node to End_Node.
+Make every time a choice to reach the End_Node.
+Do not explain anything.
+The only output should be:
+- A line containing ###
+- The number of the unique page choice, only one from the list List_Link_From_Start_Node
+- A final line containing @@@
+
+Expected output format:
+###
+Number_Of_Page_Choice
+@@@
+
+Very Important Instruction:
+- Write only the number of the page choice.
+- You must choice the page from the list List_Link_From_Start_Node
+- Do not include any reasoning or explanation.
+- Start your output with ### on a line by itself.
+- After the number of the page choice write a last line with @@@
+- Don't write a number that not is in the List_Link_From_Start_Node
+
+"""
+
+
+def format_link_list(links):
+    """
+    Returns the offered links as written in the Link-Aware request, in the link_list_format encoding.
+    """
+    if link_list_format == "lines":
+        return "\n".join(links)
+    if link_list_format == "numbered":
+        return "\n".join(f"{i}. {link}" for i, link in enumerate(links, start=1))
+    return str(links)
+
+
+def parse_link_list(text):
+    """
+    Returns the links written by format_link_list.
+    """
+    if link_list_format == "lines":
+        return text.split("\n") if text else []
+    if link_list_format == "numbered":
+        return [line.split(". ", 1)[1] for line in text.split("\n") if ". " in line]
+    return ast.literal_eval(text) if text else []
+
+
+def decode_link_choice(choice, links):
+    """
+    Returns the page title of a Link-Aware answer: with the "numbered" encoding an answer
+    with the number of a link is turned into its title, any other answer is returned as is.
+    """
+    if link_list_format == "numbered":
+        number = choice.strip().rstrip(".")
+        if number.isdigit() and 1 <= int(number) <= len(links):
+            return links[int(number) - 1]
+    return choice
+
+
 context_types = [
     ["NO_THINK", context_no_think], 
     ["THINK", context_with_think],
-    ["LINK", context_link]
+    ["LINK", context_link_numbered if link_list_format == "numbered" else context_link]
 ]
\ No newline at end of file
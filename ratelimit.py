@@ -0,0 +1,46 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: refills at rate_per_minute tokens per minute up to capacity.
+    A bucket with rate_per_minute None never blocks.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_minute / 60)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """
+        Blocks until amount tokens are available and takes them.
+        Requests larger than the capacity are capped to it.
+        """
+        if self.rate_per_minute is None:
+            return
+        amount = min(amount, self.capacity)
+        with self.lock:
+            self._refill()
+            self.tokens -= amount
+            wait = -self.tokens * 60 / self.rate_per_minute if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Empties the bucket so that no token is available for the given seconds.
+        """
+        if self.rate_per_minute is None:
+            return
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, -seconds * self.rate_per_minute / 60)
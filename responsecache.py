@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import nullcontext
+from hashlib import sha256
+
+from metrics import metrics
+from settings import response_cache_path, response_cache_mode
+
+
+# Modes: "off", "read_through" (serve hits, call and store misses), "record" (always call and store),
+# "replay" (serve hits, a miss raises ResponseCacheMiss)
+RESPONSE_CACHE_MODES = ["off", "read_through", "record", "replay"]
+
+
+class ResponseCacheMiss(Exception):
+    """
+    Raised in replay mode when a model call is not in the response cache.
+    """
+
+
+def response_key(provider, version, seed, context, request):
+    """
+    Returns the content address of a model call: a hash of the model, seed, system prompt and user request.
+    """
+    return sha256(json.dumps([provider, version, seed, context, request]).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Record/replay cache of model answers in a SQLite table: the raw answer text and the
+    token usage of each call, keyed by response_key. Answers are stored before parsing,
+    so fixing the parser or the validation only needs a replay, without any API call.
+    """
+
+    def __init__(self, path, mode="off"):
+        if mode not in RESPONSE_CACHE_MODES:
+            raise ValueError(f"Unknown response cache mode '{mode}', expected one of {RESPONSE_CACHE_MODES}")
+        self.path = path
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+    def _connection(self):
+        """
+        Returns the SQLite connection of the current thread and process, opening it if needed.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, provider TEXT, version TEXT, text TEXT, usage TEXT, recorded_at REAL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """
+        Returns (text, usage) stored for the key, or None.
+        """
+        row = self._connection().execute("SELECT text, usage FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def put(self, key, provider, version, text, usage):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, provider, version, text, usage, recorded_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, provider, version, text, json.dumps(usage), time.time()),
+        )
+        conn.commit()
+
+    def contains(self, backend, context, request):
+        """
+        Returns True if the answer of the call would be served from the cache.
+        """
+        if self.mode not in ("read_through", "replay"):
+            return False
+        return self.get(response_key(backend.provider, backend.version, backend.seed, context, request)) is not None
+
+    def generate(self, backend, context, request, usage=None, limits=None):
+        """
+        Returns the answer of backend.generate, served from or stored in the cache according to the mode.
+        The usage of a cached answer is appended to usage with "response_cache": True.
+        limits is a context manager entered around backend.generate only (the provider rate limits),
+        so that answers served by the cache are not throttled.
+        """
+        limits = limits if limits is not None else nullcontext()
+        if self.mode == "off":
+            with limits:
+                return backend.generate(context, request, usage)
+        key = response_key(backend.provider, backend.version, backend.seed, context, request)
+        if self.mode in ("read_through", "replay"):
+            cached = self.get(key)
+            if cached is not None:
+                self.hits += 1
+                metrics.add(response_cache_hits=1)
+                text, cached_usage = cached
+                if usage is not None:
+                    usage.extend(dict(call, response_cache=True) for call in cached_usage)
+                return text
+            self.misses += 1
+            if self.mode == "replay":
+                raise ResponseCacheMiss(f"{backend.provider} {backend.version}: {request[:80]!r}")
+        call_usage = []
+        with limits:
+            text = backend.generate(context, request, call_usage)
+        self.put(key, backend.provider, backend.version, text, call_usage)
+        if usage is not None:
+            usage.extend(call_usage)
+        return text
+
+
+response_cache = ResponseCache(response_cache_path, response_cache_mode)
@@ -0,0 +1,120 @@
+import argparse
+import glob
+import json
+import os
+import threading
+from hashlib import sha256
+
+
+def record_key(record):
+    """
+    Returns the key identifying the job a result record belongs to.
+    """
+    return (
+        record["game_mode"],
+        record["game_num"],
+        record["model_name"],
+        record["version_model"],
+        record["type_context"],
+    )
+
+
+def parse_shard(text):
+    """
+    Parses a "i/N" shard specification (0 <= i < N) into (i, N), as an argparse type.
+    """
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard '{text}', expected i/N (e.g. 0/4)")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"invalid shard '{text}', expected 0 <= i < N")
+    return index, count
+
+
+def shard_keys(keys, shard):
+    """
+    Returns the keys of the (i, N) shard: the keys are ordered by their hash and dealt to
+    the shards in turn, so the shards differ by at most one key and every worker computes
+    the same partition from the same keys, whatever their order.
+    """
+    index, count = shard
+    ordered = sorted(set(keys), key=lambda key: sha256(json.dumps(list(key)).encode("utf-8")).hexdigest())
+    return set(ordered[index::count])
+
+
+def shard_path(path, shard):
+    """
+    Returns the path of the file of a (i, N) shard: results.jsonl -> results.shard-i-of-N.jsonl.
+    """
+    root, extension = os.path.splitext(path)
+    return f"{root}.shard-{shard[0]}-of-{shard[1]}{extension}"
+
+
+def store_paths(path):
+    """
+    Returns the store at path followed by all its shard stores.
+    """
+    root, extension = os.path.splitext(path)
+    return [path] + sorted(glob.glob(f"{glob.escape(root)}.shard-*-of-*{extension}"))
+
+
+def merged_records(path):
+    """
+    Returns the records of the store at path and of all its shard stores, keeping the
+    first one for each key.
+    """
+    records = {}
+    for store_path in store_paths(path):
+        for record in ResultStore(store_path).records():
+            records.setdefault(record_key(record), record)
+    return list(records.values())
+
+
+class ResultStore:
+    """
+    Append-only JSONL store of result records, one line per completed job.
+    Every record is flushed to disk as soon as it is appended, so an interrupted
+    run can be resumed by skipping the keys that are already in the store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def records(self):
+        """
+        Returns the stored records, keeping the first one for each key.
+        A truncated last line (e.g. after a crash while writing) is ignored.
+        """
+        records = {}
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records.setdefault(record_key(record), record)
+        return list(records.values())
+
+    def append(self, record):
+        """
+        Appends a record and forces it to disk.
+        """
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self.lock:
+            with open(self.path, "ab+") as f:
+                # Terminate a line truncated by a previous crash before appending
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        line = b"\n" + line
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
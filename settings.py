@@ -1,2 +1,111 @@
 num_game_test = 30
-max_steps_try = 25
\ No newline at end of file
+max_steps_try = 25
+
+# Wikipedia endpoints (point them to a local stand-in to run without network)
+wikipedia_api_url = "https://en.wikipedia.org/w/api.php"
+wikipedia_base_url = "https://en.wikipedia.org/wiki/"
+
+# Persistent cache of Wikipedia lookups
+cache_path = "./cache/wikigame_cache.sqlite"
+cache_ttl_days = 30  # None to never expire
+cache_memory_size = 4096  # entries kept in the in-memory LRU layer
+cache_offline = False  # True to never hit the network, only the cache
+
+# Offline link graph snapshot (directory written by wikigraph.py or a JSON fixture).
+# When set, all link lookups are served from it instead of Wikipedia.
+link_graph_path = None
+
+# Concurrent experiment runner
+max_workers = 16  # jobs (game, context, model) run at the same time
+provider_max_concurrency = {"GPT": 16, "LLAMA": 32, "STUB": 64}  # prompts in flight per provider (LLAMA requests are limited by llama_max_requests_in_flight)
+provider_requests_per_minute = {"GPT": 500, "LLAMA": None, "STUB": None}  # None for no limit
+provider_tokens_per_minute = {"GPT": 200000, "LLAMA": None, "STUB": None}  # None for no limit
+
+# Result records are appended here as soon as each job completes
+results_store_path = "./results/results_wikigame.jsonl"
+
+# Path validation: "pltitles" checks only the edges of each path, "full" downloads every link of each page
+validation_mode = "pltitles"
+max_redirect_aliases = 500  # above this many redirects to a target, fall back to the full list of links
+
+# Shared HTTP client used for every outbound call
+http_max_retries = 5
+http_backoff_base = 1.0  # seconds, doubled at every retry (with jitter)
+http_backoff_max = 60.0  # seconds
+http_pool_size = 32  # keep-alive connections per host
+http_timeout = 60  # seconds
+http_user_agent = "wikigame-llm-eval (https://github.com/crux82/wikigame-llm-eval)"
+host_requests_per_minute = {"en.wikipedia.org": 3000}  # hosts not listed are not limited
+
+# Extraction of the visible links of an article: "fast" (single streaming pass) or "bs4" (full BeautifulSoup tree)
+link_extractor = "fast"
+
+# Visible links of each page, shared by all models during a run
+visible_links_memo_size = 2048  # pages kept in memory
+visible_links_persist = True  # also keep them in the persistent cache
+
+# Link-Aware prefetching: while the model is choosing, the visible links of the offered pages closest
+# to the goal (on the distance graph, then by title similarity) are fetched in the background.
+# Not used with link_graph_path, where the links are already local
+link_prefetch_budget = 3  # pages prefetched per step (0 to disable)
+link_prefetch_workers = 8  # background fetches at once, shared by all episodes
+
+# Also write the human statistics in Excel (the Parquet files are always written)
+statistics_excel = False
+
+# Shortest-path oracle: worker processes (None for one per CPU) and graph built from the cache when link_graph_path is not set
+oracle_processes = None
+oracle_cache_graph_path = "./cache/link_graph_from_cache"
+oracle_min_cache_coverage = 0.5  # share of the start nodes that must have links in the graph built from the cache
+
+# Distance-to-goal tracking of Link-Aware episodes: graph snapshot used for the distances
+# (None for link_graph_path, or the shortest-path oracle snapshot once it has been built)
+distance_graph_path = None
+distance_maps_memo_size = 32  # distance maps (one per end node) kept in memory
+
+# Early termination of Link-Aware episodes, recorded as termination_reason in the results:
+# "invalid_choice" (title not among the offered links), "cycle" (page already visited), "dead_end" (page without links)
+link_termination_policies = ["invalid_choice", "cycle", "dead_end"]
+
+# OpenAI API base URL (can point to a compatible or local mock server)
+openai_api_base = "https://api.openai.com/v1"
+
+# Batch API for the single-shot contexts of the GPT models: requests are written to a JSONL file,
+# submitted as one batch, polled until done and parsed back into the same result records
+batch_mode = False
+batch_contexts = ["NO_THINK", "THINK"]
+batch_requests_path = "./results/batch_requests.jsonl"
+batch_state_path = "./results/batch_state.json"  # batch in progress, so an interrupted run resumes polling it
+batch_poll_interval = 60  # seconds
+batch_completion_window = "24h"
+
+# Model backends (backends.py): set model_backend_override = "STUB" to run every model of models.py
+# with the offline deterministic stub, for load tests without network or GPU
+model_backend_override = None
+model_timeout = 60  # seconds allowed for a whole answer
+model_stream = False  # stream the answers (OpenAI), so the timeout also covers slow generations
+
+# Record/replay cache of model answers, keyed by model, seed, system prompt and user request:
+# "off", "read_through" (reuse stored answers, call the model on a miss), "record" (always call and store)
+# or "replay" (only stored answers, a miss is an error)
+response_cache_path = "./cache/responses.sqlite"
+response_cache_mode = "read_through"
+
+# Validation of the human paths: worker processes (the host rate limits are shared among them)
+# and number of distinct edges sent to a worker at a time
+human_validation_processes = 4
+human_validation_chunk_size = 1000
+
+# Runtime metrics: wall time, HTTP calls and bytes, cache hits and tokens of every model call,
+# link lookup and path check, one JSON line per operation (summary table at the end of the experiments)
+metrics_enabled = True
+metrics_path = "./results/metrics_wikigame.jsonl"
+
+# Micro-batching of the LLAMA prompts: the prompts of concurrent jobs are collected for up to llama_batch_window
+# seconds (or llama_batch_size prompts) and sent as one {"batch": [{"richiesta", "contesto"}, ...]} request, answered
+# with {"risposte": [...]} in the same order. Endpoints that do not support it get one request per prompt
+llama_batch_size = 16  # 1 to always send single requests
+llama_batch_window = 0.05  # seconds
+llama_batch_timeout = 300  # seconds allowed for a whole batch
+llama_batch_retries = 0  # retries of a failed batch, whose prompts are sent again one by one anyway
+llama_max_requests_in_flight = 2  # requests sent to the endpoint at once
@@ -0,0 +1,173 @@
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from hashlib import sha256
+
+from metrics import metrics
+from settings import cache_path, cache_ttl_days, cache_memory_size, cache_offline
+
+
+MISSING = object()
+
+
+class CacheMiss(Exception):
+    """
+    Raised in offline mode when a lookup is not available in the cache.
+    """
+
+
+def normalize_title(title):
+    """
+    Normalizes a Wikipedia page title the way MediaWiki does for lookups:
+    spaces become underscores and the first letter is upper-cased.
+    """
+    title = title.strip().replace(" ", "_")
+    return title[:1].upper() + title[1:]
+
+
+def cache_key(kind, title):
+    """
+    Returns the content address of a lookup: a hash of its kind and normalized title.
+    """
+    return sha256(f"{kind}\x00{normalize_title(title)}".encode("utf-8")).hexdigest()
+
+
+class LinkCache:
+    """
+    Two-level cache for Wikipedia lookups: a bounded in-memory LRU layer in front
+    of a SQLite table on disk. Values are stored as JSON together with the time
+    they were fetched, so stale entries can be refreshed after the TTL.
+    """
+
+    def __init__(self, path, ttl_seconds=None, memory_size=4096, offline=False):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.memory_size = memory_size
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connection(self):
+        """
+        Returns the SQLite connection of the current thread and process, opening it if needed.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, kind TEXT, title TEXT, value TEXT, fetched_at REAL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get(self, kind, title):
+        """
+        Returns the cached value for (kind, title), or MISSING if it is not cached or expired.
+        Expired entries are still returned in offline mode.
+        """
+        key = cache_key(kind, title)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                metrics.add(cache_hits=1)
+                return copy.copy(self._memory[key])
+
+        row = self._connection().execute(
+            "SELECT value, fetched_at FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        expired = (
+            row is not None
+            and self.ttl_seconds is not None
+            and time.time() - row[1] > self.ttl_seconds
+        )
+        if row is None or (expired and not self.offline):
+            self.misses += 1
+            metrics.add(cache_misses=1)
+            return MISSING
+
+        value = json.loads(row[0])
+        if isinstance(value, list) and kind == "disambiguation":
+            value = tuple(value)
+        self._remember(key, value)
+        self.hits += 1
+        metrics.add(cache_hits=1)
+        return copy.copy(value)
+
+    def put(self, kind, title, value):
+        """
+        Stores the value for (kind, title) in both layers.
+        """
+        key = cache_key(kind, title)
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, kind, title, value, fetched_at) VALUES (?, ?, ?, ?, ?)",
+            (key, kind, normalize_title(title), json.dumps(value), time.time()),
+        )
+        conn.commit()
+        self._remember(key, copy.copy(value))
+
+    def clear_memory(self):
+        """
+        Empties the in-memory layer, keeping the entries on disk.
+        """
+        with self._lock:
+            self._memory.clear()
+
+    def clear(self):
+        """
+        Removes every entry, in memory and on disk.
+        """
+        conn = self._connection()
+        conn.execute("DELETE FROM entries")
+        conn.commit()
+        self.clear_memory()
+
+
+link_cache = LinkCache(
+    cache_path,
+    ttl_seconds=cache_ttl_days * 24 * 3600 if cache_ttl_days is not None else None,
+    memory_size=cache_memory_size,
+    offline=cache_offline,
+)
+
+
+def cached(kind):
+    """
+    Decorator that serves a single-title Wikipedia lookup from the link cache,
+    calling the wrapped function only on a miss. In offline mode a miss raises CacheMiss.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(title):
+            value = link_cache.get(kind, title)
+            if value is not MISSING:
+                return value
+            if link_cache.offline:
+                raise CacheMiss(f"{kind}: {title}")
+            value = func(title)
+            link_cache.put(kind, title, value)
+            return value
+        return wrapper
+    return decorator
@@ -1,14 +1,43 @@
-import requests
 from bs4 import BeautifulSoup, Comment
+from functools import lru_cache, wraps
+from html.parser import HTMLParser
 from urllib.parse import unquote
+from settings import wikipedia_api_url, wikipedia_base_url, link_graph_path, max_redirect_aliases, link_extractor
+from settings import visible_links_memo_size, visible_links_persist
+from wikicache import cached, link_cache, normalize_title, MISSING, CacheMiss
+from httpclient import http_client
+from metrics import metrics
 
+# Maximum number of titles per query accepted by the Wikipedia API
+MAX_TITLES_PER_QUERY = 50
+
+if link_graph_path:
+    from wikigraph import load_link_graph
+    link_graph = load_link_graph(link_graph_path)
+else:
+    link_graph = None
+
+
+def graph_backed(func):
+    """
+    Decorator that serves the lookup from the offline link graph when one is configured.
+    """
+    @wraps(func)
+    def wrapper(title):
+        if link_graph is not None:
+            return getattr(link_graph, func.__name__)(title)
+        return func(title)
+    return wrapper
+
+
+@graph_backed
+@cached("disambiguation")
 def is_disambiguation_page(title):
     """
     Checks if the given Wikipedia page title is a disambiguation page.
     If it is, returns (True, first linked article title). Otherwise, returns (False, None).
     """
-    S = requests.Session()
-    URL = "https://en.wikipedia.org/w/api.php"
+    URL = wikipedia_api_url
 
     PARAMS1 = {
         "action": "query",
@@ -19,7 +48,7 @@ def is_disambiguation_page(title):
         "clshow": "!hidden"
     }
 
-    response = S.get(url=URL, params=PARAMS1)
+    response = http_client.get(URL, params=PARAMS1)
     data = response.json()
 
     pages = data["query"]["pages"]
@@ -43,7 +72,7 @@ def is_disambiguation_page(title):
         "prop": "text"
     }
 
-    response_parse = S.get(url=URL, params=PARAMS2)
+    response_parse = http_client.get(URL, params=PARAMS2)
     data_parse = response_parse.json()
     html_content = data_parse["parse"]["text"]["*"]
 
@@ -61,6 +90,9 @@ def is_disambiguation_page(title):
     return True, links[0].replace(" ", "_")
 
 
+@metrics.timed("get_internal_links_from_article")
+@graph_backed
+@cached("links")
 def get_internal_links_from_article(title):
     """
     Retrieves all internal Wikipedia article links from the given article title.
@@ -71,8 +103,7 @@ def get_internal_links_from_article(title):
     if is_disambigus:
         title = link
     
-    S = requests.Session()
-    URL = "https://en.wikipedia.org/w/api.php"
+    URL = wikipedia_api_url
 
     internal_links = []
     plcontinue = None
@@ -89,7 +120,7 @@ def get_internal_links_from_article(title):
         if plcontinue:
             PARAMS["plcontinue"] = plcontinue
 
-        response = S.get(url=URL, params=PARAMS)
+        response = http_client.get(URL, params=PARAMS)
         data = response.json()
 
         pages = data["query"]["pages"]
@@ -106,6 +137,268 @@ def get_internal_links_from_article(title):
     return internal_links
 
 
+def query_pages(params):
+    """
+    Runs a multi-title query following all its continuations.
+    Returns the merged pages (by page title) and a dict mapping every requested
+    title to the title of the page it resolves to, after normalization and redirects.
+    """
+    params = dict(params, action="query", format="json")
+    pages = {}
+    aliases = {}
+    continuation = {}
+
+    while True:
+        response = http_client.get(wikipedia_api_url, params=dict(params, **continuation))
+        data = response.json()
+        query = data.get("query", {})
+
+        for alias in query.get("normalized", []) + query.get("redirects", []):
+            aliases[alias["from"]] = alias["to"]
+        for page in query.get("pages", {}).values():
+            merged = pages.setdefault(page["title"], {"title": page["title"]})
+            for key, value in page.items():
+                if isinstance(value, list):
+                    merged.setdefault(key, []).extend(value)
+                else:
+                    merged[key] = value
+
+        if "continue" in data:
+            continuation = data["continue"]
+        else:
+            break
+
+    resolved = {}
+    for title in params["titles"].split("|"):
+        target = title
+        # Follow normalization and redirect aliases (at most a few hops)
+        for _ in range(4):
+            if target not in aliases:
+                break
+            target = aliases[target]
+        resolved[title] = target
+    return pages, resolved
+
+
+def get_internal_links_batch(titles):
+    """
+    Retrieves the internal links of many articles at once, with multi-title queries
+    of up to 50 titles returning links and categories together. Redirects are followed
+    and disambiguation pages follow their first link, as in get_internal_links_from_article.
+    The links of a redirect also include the page it points to, as its redirect page links to it.
+    Returns a dict mapping each title to its list of links (empty if the page does not exist).
+    """
+    result = {}
+    to_fetch = []
+    for title in dict.fromkeys(titles):
+        if link_graph is not None:
+            page_id = link_graph.resolve(title)
+            page = link_graph.titles[page_id] if page_id is not None else title
+            result[title] = link_graph.get_internal_links_from_article(page)
+            if page_id is not None and page != normalize_title(title):
+                result[title].append(page)
+            continue
+        value = link_cache.get("resolved_links", title)
+        if value is not MISSING:
+            result[title] = value
+        elif link_cache.offline:
+            raise CacheMiss(f"resolved_links: {title}")
+        else:
+            to_fetch.append(title)
+
+    for i in range(0, len(to_fetch), MAX_TITLES_PER_QUERY):
+        chunk = to_fetch[i:i + MAX_TITLES_PER_QUERY]
+        pages, resolved = query_pages({
+            "prop": "links|categories",
+            "titles": "|".join(chunk),
+            "redirects": 1,
+            "plnamespace": 0,
+            "pllimit": "max",
+            "cllimit": "max",
+            "clshow": "!hidden"
+        })
+        for title in chunk:
+            page = pages.get(resolved[title], {})
+            categories = [cat["title"] for cat in page.get("categories", [])]
+            if "Category:Disambiguation pages" in categories:
+                links = get_internal_links_from_article(page["title"].replace(" ", "_"))
+            else:
+                links = [link["title"].replace(" ", "_") for link in page.get("links", [])]
+            if page and "missing" not in page and normalize_title(resolved[title]) != normalize_title(title):
+                links.append(normalize_title(resolved[title]))
+            result[title] = links
+            link_cache.put("resolved_links", title, links)
+
+    return result
+
+
+def resolve_targets(titles):
+    """
+    Resolves the given titles through redirects and collects the other redirects
+    pointing to the same page. Returns a dict mapping each title to
+    (title of the page it resolves to, list of the redirects to that page).
+    """
+    result = {}
+    titles = list(dict.fromkeys(titles))
+    for i in range(0, len(titles), MAX_TITLES_PER_QUERY):
+        chunk = titles[i:i + MAX_TITLES_PER_QUERY]
+        pages, resolved = query_pages({
+            "prop": "redirects",
+            "titles": "|".join(chunk),
+            "redirects": 1,
+            "rdnamespace": 0,
+            "rdlimit": "max"
+        })
+        for title in chunk:
+            page = pages.get(resolved[title], {})
+            result[title] = (resolved[title], [redirect["title"] for redirect in page.get("redirects", [])])
+    return result
+
+
+def pack_queries(pairs):
+    """
+    Packs (source, title) pairs into queries of at most 50 sources and 50 titles, keeping
+    together the sources and the titles they are asked about, so that the number of queries
+    grows with the number of pairs instead of the product of sources and titles.
+    Returns a list of (sources, titles).
+    """
+    wanted = {}
+    for source, title in pairs:
+        wanted.setdefault(source, {})[title] = None
+    units = []
+    for source, titles in wanted.items():
+        titles = list(titles)
+        for i in range(0, len(titles), MAX_TITLES_PER_QUERY):
+            units.append((source, titles[i:i + MAX_TITLES_PER_QUERY]))
+
+    # Largest units first, each in the first query with room for its source and titles
+    units.sort(key=lambda unit: len(unit[1]), reverse=True)
+    queries = []
+    for source, titles in units:
+        for query_sources, query_titles in queries:
+            if source not in query_sources and len(query_sources) >= MAX_TITLES_PER_QUERY:
+                continue
+            new_titles = [title for title in titles if title not in query_titles]
+            if len(query_titles) + len(new_titles) <= MAX_TITLES_PER_QUERY:
+                query_sources[source] = None
+                query_titles.update(dict.fromkeys(new_titles))
+                break
+        else:
+            queries.append(({source: None}, dict.fromkeys(titles)))
+    return [(list(query_sources), list(query_titles)) for query_sources, query_titles in queries]
+
+
+def find_links(pairs):
+    """
+    Asks the API which titles are linked from which source pages, for the given
+    (source, title) pairs, using the pltitles filter instead of downloading every link.
+    Redirects of the sources are followed.
+    Returns a dict mapping each source to (page status, set of normalized linked titles,
+    normalized title of the page the source resolves to), where the status is
+    "MISSING", "DISAMBIGUATION" or "OK".
+    """
+    result = {}
+    for sources, titles in pack_queries(pairs):
+        pages, resolved = query_pages({
+            "prop": "links|categories",
+            "titles": "|".join(sources),
+            "pltitles": "|".join(titles),
+            "redirects": 1,
+            "plnamespace": 0,
+            "pllimit": "max",
+            "cllimit": "max",
+            "clshow": "!hidden"
+        })
+        for source in sources:
+            page = pages.get(resolved[source], {})
+            status, linked, target = result.get(source, ("OK", set(), normalize_title(resolved[source])))
+            categories = [cat["title"] for cat in page.get("categories", [])]
+            if not page or "missing" in page or "invalid" in page:
+                status = "MISSING"
+            elif "Category:Disambiguation pages" in categories:
+                status = "DISAMBIGUATION"
+            linked.update(normalize_title(link["title"]) for link in page.get("links", []))
+            result[source] = (status, linked, target)
+    return result
+
+
+@metrics.timed("check_links_batch")
+def check_links_batch(edges):
+    """
+    Checks whether each (prev, next) edge exists, asking the API only about the specific
+    targets instead of downloading every link of prev. A link that reaches next through
+    a redirect counts as a valid link. The full list of links is downloaded only for
+    disambiguation pages and for targets with more than max_redirect_aliases redirects.
+    Returns a dict mapping each edge to "LINK", "REDIRECT", "NO LINK" or "NO PAGE".
+    """
+    result = {}
+    pending = []
+    for prev, next in dict.fromkeys(edges):
+        if link_graph is not None:
+            result[(prev, next)] = link_graph.edge_status(prev, next)
+            continue
+        value = link_cache.get("edge", f"{prev}|{next}")
+        if value is not MISSING:
+            result[(prev, next)] = value
+        elif link_cache.offline:
+            raise CacheMiss(f"edge: {prev}|{next}")
+        else:
+            pending.append((prev, next))
+    if not pending:
+        return result
+
+    targets = resolve_targets([next for _, next in pending])
+
+    # First round: the target as written and the page it resolves to
+    first = find_links((prev, title) for prev, next in pending for title in (next, targets[next][0]))
+    aliases_needed = []
+    full_needed = []
+    for prev, next in pending:
+        status, linked, page = first[prev]
+        canonical, redirects = targets[next]
+        if status == "MISSING":
+            result[(prev, next)] = "NO PAGE"
+        elif page == normalize_title(canonical) and page != normalize_title(prev):
+            # prev is a redirect to next: its redirect page links to next
+            result[(prev, next)] = "REDIRECT"
+        elif status == "DISAMBIGUATION" or len(redirects) > max_redirect_aliases:
+            full_needed.append((prev, next))
+        elif normalize_title(next) in linked:
+            result[(prev, next)] = "LINK"
+        elif normalize_title(canonical) in linked:
+            result[(prev, next)] = "REDIRECT"
+        elif redirects:
+            aliases_needed.append((prev, next))
+        else:
+            result[(prev, next)] = "NO LINK"
+
+    # Second round: the other redirects to the target page
+    if aliases_needed:
+        second = find_links((prev, title) for prev, next in aliases_needed for title in targets[next][1])
+        for prev, next in aliases_needed:
+            redirects = {normalize_title(title) for title in targets[next][1]}
+            result[(prev, next)] = "REDIRECT" if second[prev][1] & redirects else "NO LINK"
+
+    # Fallback: compare against the full list of links
+    if full_needed:
+        links = get_internal_links_batch(prev for prev, _ in full_needed)
+        for prev, next in full_needed:
+            canonical, redirects = targets[next]
+            linked = {normalize_title(link) for link in links[prev]}
+            if not linked:
+                result[(prev, next)] = "NO PAGE"
+            elif normalize_title(next) in linked:
+                result[(prev, next)] = "LINK"
+            elif linked & {normalize_title(title) for title in [canonical] + redirects}:
+                result[(prev, next)] = "REDIRECT"
+            else:
+                result[(prev, next)] = "NO LINK"
+
+    for prev, next in pending:
+        link_cache.put("edge", f"{prev}|{next}", result[(prev, next)])
+    return result
+
+
 def remove_all_hidden_blocks(soup):
     """
     Removes all HTML elements from the BeautifulSoup object that are hidden (via 'hidden' attribute or CSS styles).
@@ -124,14 +417,56 @@ def remove_all_hidden_blocks(soup):
         except Exception:
             continue
 
+@metrics.timed("get_all_visible_existing_internal_links")
 def get_all_visible_existing_internal_links(title, steps):
     """
     Returns all visible, existing internal Wikipedia article links from the given article title,
     excluding links that are in the 'steps' list. Only considers links in the main content area.
+    The links are sorted, so the same page always produces the same request.
+    """
+    return sorted(get_visible_link_set(title).difference(steps))
+
+
+@lru_cache(maxsize=visible_links_memo_size)
+def get_visible_link_set(title):
+    """
+    Returns the visible links of the article as a frozenset, memoized for the whole run
+    so that every model and episode reaching the page shares the same download and parse.
+    With visible_links_persist the links are also kept in the persistent cache.
+    """
+    if visible_links_persist or link_graph is not None:
+        return frozenset(get_visible_internal_links(title))
+    return frozenset(fetch_visible_internal_links(title))
+
+
+@graph_backed
+@cached("visible_links")
+def get_visible_internal_links(title):
+    """
+    Returns the visible, existing internal links of the main content area of the article,
+    without any exclusion, as a sorted list.
+    """
+    return fetch_visible_internal_links(title)
+
+
+@metrics.timed("fetch_visible_internal_links")
+def fetch_visible_internal_links(title):
+    """
+    Downloads the rendered article and extracts its visible, existing internal links.
+    """
+    url = f"{wikipedia_base_url}{title}"
+    html = http_client.get(url).text
+    if link_extractor == "bs4":
+        return extract_visible_links_bs4(html)
+    return extract_visible_links(html)
+
+
+@metrics.timed("extract_visible_links_bs4")
+def extract_visible_links_bs4(html):
+    """
+    Reference extractor: builds the full BeautifulSoup tree, removes comments and navboxes
+    and walks every link of the bodyContent div.
     """
-    steps_dict = set(steps)
-    url = f"https://en.wikipedia.org/wiki/{title}"
-    html = requests.get(url).text
     soup = BeautifulSoup(html, 'html.parser')
     body_content = soup.find('div', id='bodyContent')
     for comment in body_content.find_all(string=lambda text: isinstance(text, Comment)):
@@ -155,5 +490,100 @@ def get_all_visible_existing_internal_links(title, steps):
         title = unquote(href.split("/wiki/")[1]).replace(" ", "_")
         result.add(title)
     
-    result = result.difference(steps_dict)
-    return list(result)
+    return sorted(result)
+
+
+class VisibleLinkParser(HTMLParser):
+    """
+    Single-pass version of extract_visible_links_bs4: collects the links while
+    tokenizing, without building a tree. It keeps only a stack of the open elements,
+    managed like the html.parser tree builder of BeautifulSoup (void elements are
+    closed at once, an end tag closes everything up to the most recent element with
+    the same name, stray end tags are ignored), so the result is the same.
+    """
+
+    # Elements BeautifulSoup closes as soon as they are opened
+    VOID_ELEMENTS = {
+        "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem",
+        "meta", "param", "source", "track", "wbr", "basefont", "bgsound", "command", "frame",
+        "image", "isindex", "nextid", "spacer"
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        # Each open element is (name, inside .mw-parser-output, inside a removed navbox, inside bodyContent)
+        self.stack = []
+        self.open_count = {}
+        self.already_closed = {}
+        self.body_found = False
+        self.body_closed = False
+        self.links = set()
+
+    def open_element(self, name, attrs, handle_void=True):
+        attributes = {}
+        for key, value in attrs:
+            attributes[key] = "" if value is None else value
+        classes = attributes.get("class", "").split()
+        parser_output, navbox, body = self.stack[-1][1:] if self.stack else (False, False, False)
+
+        if body and not navbox and not (parser_output and "navbox" in classes):
+            href = attributes.get("href")
+            if name == "a" and href is not None and href.startswith("/wiki/") and ':' not in href and 'new' not in classes:
+                self.links.add(unquote(href.split("/wiki/")[1]).replace(" ", "_"))
+
+        is_body = not self.body_found and name == "div" and attributes.get("id") == "bodyContent"
+        if is_body:
+            self.body_found = True
+        self.stack.append((
+            name,
+            parser_output or "mw-parser-output" in classes,
+            navbox or (body and parser_output and "navbox" in classes),
+            body or is_body
+        ))
+        self.open_count[name] = self.open_count.get(name, 0) + 1
+        if name in self.VOID_ELEMENTS and handle_void:
+            self.close_element(name, check_already_closed=False)
+            self.already_closed[name] = self.already_closed.get(name, 0) + 1
+
+    def close_element(self, name, check_already_closed=True):
+        if check_already_closed and self.already_closed.get(name):
+            self.already_closed[name] -= 1
+            return
+        if not self.open_count.get(name):
+            return
+        while self.stack:
+            popped, _, _, body = self.stack.pop()
+            self.open_count[popped] -= 1
+            if body and not (self.stack and self.stack[-1][3]):
+                self.body_closed = True
+            if popped == name:
+                break
+
+    def handle_starttag(self, tag, attrs):
+        self.open_element(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        self.open_element(tag, attrs, handle_void=False)
+        self.close_element(tag, check_already_closed=False)
+
+    def handle_endtag(self, tag):
+        self.close_element(tag)
+
+
+@metrics.timed("extract_visible_links")
+def extract_visible_links(html):
+    """
+    Returns the sorted visible, existing internal links of the bodyContent div of an
+    article, with the same rules as extract_visible_links_bs4 in a single streaming pass.
+    Parsing stops as soon as the bodyContent div is closed.
+    """
+    parser = VisibleLinkParser()
+    for i in range(0, len(html), 65536):
+        parser.feed(html[i:i + 65536])
+        if parser.body_closed:
+            break
+    else:
+        parser.close()
+    if not parser.body_found:
+        raise ValueError("No bodyContent div in the article")
+    return sorted(parser.links)
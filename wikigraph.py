@@ -0,0 +1,462 @@
+import json
+import os
+import sqlite3
+import sys
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+
+from wikicache import normalize_title
+
+
+# Arrays of the navigation adjacency (redirects followed, red links dropped) saved with a snapshot
+NAVIGATION_ARRAYS = ["navigation_indptr", "navigation_indices", "reverse_indptr", "reverse_indices"]
+
+
+class WikiGraph:
+    """
+    Frozen snapshot of the Wikipedia link graph stored as a compressed sparse row
+    adjacency over integer title IDs. Titles are kept sorted, so the ID of a title
+    is its position in the list. Links are stored as they are written in the
+    articles (they may point to redirects or to pages that do not exist).
+
+    Arrays:
+    - indptr, indices: CSR adjacency, the links of page i are indices[indptr[i]:indptr[i + 1]]
+    - redirect: ID of the page each title resolves to (itself when it is not a redirect)
+    - exists: 1 if the title is an existing page or redirect, 0 for red links
+    - disambiguation: ID of the first linked article for disambiguation pages, -1 otherwise
+    """
+
+    def __init__(self, titles, indptr, indices, redirect, exists, disambiguation):
+        self.titles = titles
+        self.indptr = indptr
+        self.indices = indices
+        self.redirect = redirect
+        self.exists = exists
+        self.disambiguation = disambiguation
+        self._navigation = None
+
+    def __len__(self):
+        return len(self.titles)
+
+    @property
+    def num_links(self):
+        return len(self.indices)
+
+    def title_id(self, title):
+        """
+        Returns the ID of the given title, or None if the title is not in the graph.
+        """
+        title = normalize_title(title)
+        i = bisect_left(self.titles, title)
+        if i < len(self.titles) and self.titles[i] == title:
+            return i
+        return None
+
+    def resolve(self, title):
+        """
+        Returns the ID of the existing page the given title leads to, following redirects.
+        Returns None if the page does not exist.
+        """
+        i = self.title_id(title)
+        if i is None or not self.exists[i]:
+            return None
+        return int(self.redirect[i])
+
+    def neighbors(self, i):
+        """
+        Returns the IDs linked from page i, as written in the article.
+        """
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def edge_status(self, prev, next):
+        """
+        Same contract as the statuses of wikigametools.check_links_batch:
+        "LINK", "REDIRECT", "NO LINK" or "NO PAGE".
+        """
+        i = self.resolve(prev)
+        if i is None:
+            return "NO PAGE"
+        # prev is a redirect to next: its redirect page links to next
+        if i != self.title_id(prev) and i == self.resolve(next):
+            return "REDIRECT"
+        is_disambigus, link = self.is_disambiguation_page(prev)
+        if is_disambigus:
+            i = self.title_id(link)
+            if i is None:
+                return "NO PAGE"
+        neighbors = self.neighbors(i)
+        j = self.title_id(next)
+        if j is not None and np.any(neighbors == j):
+            return "LINK"
+        j = self.resolve(next)
+        if j is not None and np.any(self.redirect[neighbors] == j):
+            return "REDIRECT"
+        return "NO LINK"
+
+    def is_disambiguation_page(self, title):
+        """
+        Same contract as wikigametools.is_disambiguation_page.
+        """
+        i = self.resolve(title)
+        if i is None or self.disambiguation[i] < 0:
+            return False, None
+        return True, self.titles[self.disambiguation[i]]
+
+    def get_internal_links_from_article(self, title):
+        """
+        Same contract as wikigametools.get_internal_links_from_article.
+        Returns an empty list if the page is not in the graph.
+        """
+        is_disambigus, link = self.is_disambiguation_page(title)
+        if is_disambigus:
+            title = link
+        i = self.title_id(title)
+        if i is None or not self.exists[i]:
+            return []
+        return [self.titles[j] for j in self.neighbors(i)]
+
+    def get_visible_internal_links(self, title):
+        """
+        Same contract as wikigametools.get_visible_internal_links: the existing pages
+        linked from the article the title leads to.
+        """
+        i = self.resolve(title)
+        if i is None:
+            return []
+        neighbors = self.neighbors(i)
+        return sorted({self.titles[j] for j in neighbors[self.exists[neighbors] == 1]})
+
+    def get_all_visible_existing_internal_links(self, title, steps):
+        """
+        Same contract as wikigametools.get_all_visible_existing_internal_links.
+        """
+        return sorted(set(self.get_visible_internal_links(title)).difference(steps))
+
+    def navigation_adjacency(self):
+        """
+        Returns the forward and reverse CSR adjacency (indptr, indices) used for navigation:
+        links are followed through redirects and links to pages that do not exist are dropped.
+        Both are built on first use (or loaded with the snapshot) and kept on the graph.
+        """
+        if self._navigation is None:
+            n = len(self.titles)
+            indices = np.asarray(self.indices)
+            targets = np.asarray(self.redirect)[indices]
+            sources = np.repeat(np.arange(n, dtype=np.int32), np.diff(self.indptr))
+            keep = np.asarray(self.exists)[targets] == 1
+            # A page may reach the same target both directly and through a redirect: count it once.
+            # Links are unique within each page, so only pages with a redirected link are checked.
+            redirected = np.flatnonzero(targets != indices)
+            if len(redirected):
+                rows = np.isin(sources, np.unique(sources[redirected]))
+                candidates = np.flatnonzero(rows & keep)
+                _, first = np.unique(sources[candidates].astype(np.int64) * n + targets[candidates], return_index=True)
+                keep[candidates] = False
+                keep[candidates[first]] = True
+            sources = sources[keep]
+            targets = targets[keep]
+            forward_indptr = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(sources, minlength=n), out=forward_indptr[1:])
+            reverse_indptr = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(targets, minlength=n), out=reverse_indptr[1:])
+            reverse_indices = sources[np.argsort(targets, kind="stable")]
+            self._navigation = ((forward_indptr, targets), (reverse_indptr, reverse_indices))
+        return self._navigation
+
+    def save_navigation(self, directory):
+        """
+        Writes the navigation adjacency next to a saved snapshot, so that load can
+        memory-map it instead of building it again in every process.
+        """
+        (forward_indptr, forward_indices), (reverse_indptr, reverse_indices) = self.navigation_adjacency()
+        for name, values in zip(NAVIGATION_ARRAYS, [forward_indptr, forward_indices, reverse_indptr, reverse_indices]):
+            np.save(os.path.join(directory, f"{name}.npy"), values)
+
+    @staticmethod
+    def _expand(adjacency, frontier, counts):
+        """
+        Returns the neighbors of all the frontier nodes and, for each of them,
+        the number of paths reaching the frontier node it comes from.
+        """
+        indptr, indices = adjacency
+        starts = indptr[frontier]
+        lengths = indptr[frontier + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return indices[offsets], np.repeat(counts[frontier], lengths)
+
+    def shortest_path_stats(self, start, end):
+        """
+        Bidirectional breadth-first search from start to end, always expanding the side
+        with the smaller frontier. Returns (shortest number of hops, number of shortest paths),
+        or (None, 0) if end cannot be reached.
+        """
+        s = self.resolve(start)
+        t = self.resolve(end)
+        if s is None or t is None:
+            return None, 0
+        if s == t:
+            return 0, 1
+        forward, reverse = self.navigation_adjacency()
+        n = len(self.titles)
+        # Distance and number of shortest paths from start (side 0) and to end (side 1)
+        dist = [np.full(n, -1, dtype=np.int32), np.full(n, -1, dtype=np.int32)]
+        counts = [np.zeros(n, dtype=np.float64), np.zeros(n, dtype=np.float64)]
+        frontiers = [np.array([s]), np.array([t])]
+        depths = [0, 0]
+        for side, node in ((0, s), (1, t)):
+            dist[side][node] = 0
+            counts[side][node] = 1
+        adjacency = [forward, reverse]
+
+        while len(frontiers[0]) and len(frontiers[1]):
+            # Expand the side whose frontier has fewer links to follow
+            sizes = [int((adjacency[i][0][frontiers[i] + 1] - adjacency[i][0][frontiers[i]]).sum()) for i in (0, 1)]
+            side = 0 if sizes[0] <= sizes[1] else 1
+            other = 1 - side
+            neighbors, path_counts = self._expand(adjacency[side], frontiers[side], counts[side])
+            new = dist[side][neighbors] == -1
+            neighbors, path_counts = neighbors[new], path_counts[new]
+            np.add.at(counts[side], neighbors, path_counts)
+            frontier = np.unique(neighbors)
+            depths[side] += 1
+            dist[side][frontier] = depths[side]
+            frontiers[side] = frontier
+
+            # The first layer touching the other search contains every shortest path exactly once
+            met = frontier[dist[other][frontier] >= 0]
+            if len(met):
+                return depths[0] + depths[1], float((counts[side][met] * counts[other][met]).sum())
+        return None, 0
+
+    def distances_to(self, end):
+        """
+        Breadth-first search on the reverse graph from end. Returns an array with the number
+        of hops from every page to end (-1 where end cannot be reached), or None if end does not exist.
+        """
+        t = self.resolve(end)
+        if t is None:
+            return None
+        _, reverse = self.navigation_adjacency()
+        dist = np.full(len(self.titles), -1, dtype=np.int32)
+        dist[t] = 0
+        frontier = np.array([t])
+        depth = 0
+        while len(frontier):
+            neighbors, _ = self._expand(reverse, frontier, np.zeros(len(self.titles)))
+            frontier = np.unique(neighbors[dist[neighbors] == -1])
+            depth += 1
+            dist[frontier] = depth
+        return dist
+
+    def distance_to(self, distances, title):
+        """
+        Returns the hops from title to the end of a distances_to map, or None if title
+        does not exist or cannot reach it.
+        """
+        i = self.resolve(title)
+        if i is None or distances[i] < 0:
+            return None
+        return int(distances[i])
+
+    def shortest_path(self, distances, start):
+        """
+        Returns one shortest path (list of titles) from start to the end of a distances_to map,
+        following at each page the first link one hop closer, or None if end cannot be reached.
+        """
+        i = self.resolve(start)
+        if i is None or distances[i] < 0:
+            return None
+        indptr, indices = self.navigation_adjacency()[0]
+        path = [self.titles[i]]
+        while distances[i] > 0:
+            neighbors = np.asarray(indices[indptr[i]:indptr[i + 1]])
+            i = int(neighbors[np.flatnonzero(distances[neighbors] == distances[i] - 1)[0]])
+            path.append(self.titles[i])
+        return path
+
+    def save(self, directory):
+        """
+        Writes the snapshot to a directory: one .npy file per array and the sorted titles.
+        """
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "titles.txt"), "w", encoding="utf-8") as f:
+            for title in self.titles:
+                f.write(title + "\n")
+        for name in ["indptr", "indices", "redirect", "exists", "disambiguation"]:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        # The navigation adjacency of a previous snapshot no longer matches
+        for name in NAVIGATION_ARRAYS:
+            if os.path.exists(os.path.join(directory, f"{name}.npy")):
+                os.remove(os.path.join(directory, f"{name}.npy"))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Loads a snapshot written by save. Arrays are memory-mapped unless mmap is False.
+        """
+        with open(os.path.join(directory, "titles.txt"), "r", encoding="utf-8") as f:
+            titles = f.read().split("\n")[:-1]
+        arrays = [
+            np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+            for name in ["indptr", "indices", "redirect", "exists", "disambiguation"]
+        ]
+        graph = cls(titles, *arrays)
+        if all(os.path.exists(os.path.join(directory, f"{name}.npy")) for name in NAVIGATION_ARRAYS):
+            navigation = [
+                np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                for name in NAVIGATION_ARRAYS
+            ]
+            graph._navigation = ((navigation[0], navigation[1]), (navigation[2], navigation[3]))
+        return graph
+
+    @classmethod
+    def from_edges(cls, links, redirects=(), pages=(), disambiguation=()):
+        """
+        Builds the snapshot from iterables of (source, target) links, (source, target)
+        redirects, existing page titles and (page, first linked article) disambiguation pairs.
+        Every link source and redirect source is considered an existing page.
+        """
+        ids = {}
+        sources = array("q")
+        targets = array("q")
+        existing = set()
+
+        def title_id(title):
+            title = normalize_title(title)
+            if title not in ids:
+                ids[title] = len(ids)
+            return ids[title]
+
+        for source, target in links:
+            sources.append(title_id(source))
+            targets.append(title_id(target))
+        existing.update(sources)
+        redirect_pairs = [(title_id(source), title_id(target)) for source, target in redirects]
+        existing.update(source for source, _ in redirect_pairs)
+        existing.update(title_id(page) for page in pages)
+        disambiguation_pairs = [(title_id(page), title_id(target)) for page, target in disambiguation]
+
+        # Renumber the titles in sorted order
+        titles = sorted(ids)
+        order = np.empty(len(titles), dtype=np.int64)
+        for new_id, title in enumerate(titles):
+            order[ids[title]] = new_id
+        del ids
+
+        sources = order[np.frombuffer(sources, dtype=np.int64)]
+        targets = order[np.frombuffer(targets, dtype=np.int64)]
+        edges = np.unique(sources * len(titles) + targets)
+        sources = edges // len(titles)
+        indices = (edges % len(titles)).astype(np.int32)
+        indptr = np.zeros(len(titles) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(titles)), out=indptr[1:])
+
+        exists = np.zeros(len(titles), dtype=np.uint8)
+        exists[order[list(existing)]] = 1
+        redirect = np.arange(len(titles), dtype=np.int32)
+        for source, target in redirect_pairs:
+            redirect[order[source]] = order[target]
+        # Follow chains of redirects (A -> B -> C) to their final page
+        for _ in range(8):
+            chained = redirect[redirect]
+            if np.array_equal(chained, redirect):
+                break
+            redirect = chained
+        disambiguation_ids = np.full(len(titles), -1, dtype=np.int32)
+        for page, target in disambiguation_pairs:
+            disambiguation_ids[order[page]] = order[target]
+
+        return cls(titles, indptr, indices, redirect, exists, disambiguation_ids)
+
+    @classmethod
+    def from_json(cls, path):
+        """
+        Builds the snapshot from a JSON fixture:
+        {"links": {title: [linked titles]}, "redirects": {title: target}, "disambiguation": {title: first link}}
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        links = data["links"]
+        return cls.from_edges(
+            ((source, target) for source, targets in links.items() for target in targets),
+            redirects=data.get("redirects", {}).items(),
+            pages=links.keys(),
+            disambiguation=data.get("disambiguation", {}).items(),
+        )
+
+    @classmethod
+    def from_link_cache(cls, cache_path):
+        """
+        Builds the snapshot from the links already stored in the SQLite cache of wikicache:
+        the visible links of the pages reached in Link-Aware episodes, and the edges of the
+        model and human paths that were checked as existing (LINK or REDIRECT).
+        Only these pages have outgoing links, redirects are not known and every link target
+        is considered an existing page, so distances computed on this graph are upper
+        bounds of the distances on the live Wikipedia graph.
+        """
+        connection = sqlite3.connect(cache_path)
+        try:
+            rows = connection.execute(
+                "SELECT kind, title, value FROM entries WHERE kind IN ('visible_links', 'edge')"
+            ).fetchall()
+        finally:
+            connection.close()
+        links = []
+        for kind, title, value in rows:
+            value = json.loads(value)
+            if kind == "visible_links":
+                # Links to a section lead to the page
+                links.extend((title, target.split("#")[0]) for target in value if target.split("#")[0])
+            elif value in ("LINK", "REDIRECT"):
+                source, target = title.split("|", 1)
+                links.append((source, target))
+        # Pages that were never fetched are only known as link targets: consider them existing
+        return cls.from_edges(links, pages=[target for _, target in links])
+
+    def coverage(self, titles):
+        """
+        Returns the share of the given titles that are pages with outgoing links in the graph.
+        """
+        covered = 0
+        for title in titles:
+            i = self.resolve(title)
+            covered += i is not None and self.indptr[i + 1] > self.indptr[i]
+        return covered / len(titles) if titles else 0.0
+
+    @classmethod
+    def from_tsv(cls, links_path, redirects_path=None):
+        """
+        Builds the snapshot from tab-separated "source<TAB>target" files, as extracted
+        from the pagelinks and redirect tables of a Wikipedia dump.
+        """
+        def read_pairs(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) == 2:
+                        yield parts[0], parts[1]
+
+        redirects = list(read_pairs(redirects_path)) if redirects_path else ()
+        return cls.from_edges(read_pairs(links_path), redirects=redirects)
+
+
+def load_link_graph(path):
+    """
+    Loads the offline link graph from a snapshot directory, or builds it from a JSON fixture.
+    """
+    if os.path.isdir(path):
+        return WikiGraph.load(path)
+    return WikiGraph.from_json(path)
+
+
+if __name__ == "__main__":
+    # Usage: python wikigraph.py <links.tsv|fixture.json> <output_dir> [redirects.tsv]
+    source_path, output_dir = sys.argv[1], sys.argv[2]
+    if source_path.endswith(".json"):
+        graph = WikiGraph.from_json(source_path)
+    else:
+        graph = WikiGraph.from_tsv(source_path, sys.argv[3] if len(sys.argv) > 3 else None)
+    graph.save(output_dir)
+    print(f"Link graph saved in '{output_dir}': {len(graph)} titles, {graph.num_links} links")